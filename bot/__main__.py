@@ -1,19 +1,48 @@
 import asyncio
 
+from bot.cleanup import cleanup_scheduler
+from bot.executor import render_executor
 from bot.handlers.handler import form_router
+from bot.jobs import get_job_queue, get_stream_queue
+from bot.lifecycle import lifecycle
 from bot.loguru_logger import configure_logging
-from bot.settings import bot, dp, settings
+from bot.metrics import MetricsMiddleware, start_metrics_server
+from bot.settings import get_bot, get_dispatcher, settings
+from bot.throttling import ThrottlingMiddleware, create_rate_limiter
+from bot.webhook import run_webhook
+from bot.worker.worker import RenderWorker
 
 
 async def main():
     configure_logging(logging_level=settings.log_level_number)
+    bot = get_bot()
+    dp = get_dispatcher()
     dp.include_router(form_router)
-    await asyncio.sleep(0.5)
+    dp.message.middleware(MetricsMiddleware())
+    if settings.rate_limit > 0:
+        dp.message.outer_middleware(ThrottlingMiddleware(create_rate_limiter()))
+    # Остановка дожидается начатых рендеров раньше остальных обработчиков
+    lifecycle.install(dp)
+    dp.shutdown.register(render_executor.shutdown)
+    dp.shutdown.register(cleanup_scheduler.shutdown)
+    # warm_up дожидается запуска всех процессов, дополнительная пауза не нужна
+    await render_executor.warm_up()
+    saved_jobs = get_stream_queue() if get_job_queue() is None else None
+    if saved_jobs is not None:
+        worker = RenderWorker(saved_jobs, bot, dp.storage, settings.render_workers)
+        lifecycle.run_worker(worker)
     await bot.delete_my_commands(request_timeout=1)
     await bot.set_my_commands(
         commands=settings.bot_commands
     )
-    await dp.start_polling(bot)
+    if settings.run_mode == "webhook":
+        await run_webhook(dp, bot)
+    else:
+        if settings.metrics_port is not None:
+            metrics_runner = await start_metrics_server()
+            dp.shutdown.register(metrics_runner.cleanup)
+        await bot.delete_webhook()
+        await dp.start_polling(bot)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,69 @@
+import pathlib
+from typing import Dict, Tuple
+
+from PIL import Image, ImageChops
+from reportlab.lib.utils import ImageReader
+
+CompanyAssets = Dict[str, ImageReader]
+
+PixelSize = Tuple[int, int]
+
+_images: Dict[
+    Tuple[pathlib.Path, bool, PixelSize | None], Tuple[int, ImageReader]
+] = {}
+
+
+def black_to_alpha(img: Image.Image) -> Image.Image:
+    img = img.convert("RGBA")
+    r, g, b, _ = img.split()
+    # Маска пикселей, у которых все каналы равны 0 (чистый черный)
+    black = ImageChops.lighter(ImageChops.lighter(r, g), b).point(
+        lambda v: 255 if v == 0 else 0
+    )
+    img.paste((255, 255, 255, 0), mask=black)
+    return img
+
+
+def open_image(
+    path: pathlib.Path, transparent_black: bool = False, size: PixelSize | None = None
+) -> Image.Image:
+    with Image.open(path) as img:
+        img.load()
+        img = black_to_alpha(img) if transparent_black else img.copy()
+    if size is not None:
+        # Пикселей больше, чем нужно для размера на странице, не оставляем.
+        # Пропорции не сохраняются: drawImage все равно растягивает картинку
+        fitted = (min(img.width, size[0]), min(img.height, size[1]))
+        if fitted != img.size:
+            img = img.resize(fitted, Image.Resampling.LANCZOS)
+    if img.mode == "RGBA" and img.getextrema()[3][0] == 255:
+        # Полностью непрозрачный альфа-канал - лишняя маска в PDF
+        img = img.convert("RGB")
+    return img
+
+
+def load_image(
+    path: pathlib.Path, transparent_black: bool = False, size: PixelSize | None = None
+) -> ImageReader:
+    mtime = path.stat().st_mtime_ns
+    key = (path, transparent_black, size)
+    cached = _images.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    reader = ImageReader(open_image(path, transparent_black, size))
+    # Декодируем пиксели сразу, чтобы рендер получал готовые данные
+    reader.getRGBData()
+    _images[key] = (mtime, reader)
+    return reader
+
+
+def get_company_assets(
+    images: Dict[str, Tuple[pathlib.Path, bool]],
+    sizes: Dict[str, PixelSize] | None = None,
+) -> CompanyAssets:
+    sizes = sizes or {}
+    return {
+        name: load_image(path, transparent_black, sizes.get(name))
+        for name, (path, transparent_black) in images.items()
+    }
@@ -0,0 +1,36 @@
+import argparse
+import asyncio
+import pathlib
+
+from loguru import logger
+
+from bot.batch.batch import BatchArchive, read_rows, run_batch
+from bot.executor import render_executor
+from bot.templates import company_names
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m bot.batch", description="Пакетная генерация договоров"
+    )
+    parser.add_argument("input", type=pathlib.Path, help="CSV или JSON файл")
+    parser.add_argument("--company", choices=company_names())
+    parser.add_argument(
+        "--output", type=pathlib.Path, default=pathlib.Path("contracts.zip")
+    )
+    args = parser.parse_args()
+
+    rows = read_rows(args.input.name, args.input.read_bytes())
+    archive = BatchArchive(args.output)
+    try:
+        await render_executor.warm_up()
+        rendered, errors = await run_batch(rows, archive, args.company)
+    finally:
+        await render_executor.shutdown()
+    logger.info(f"Rendered {rendered} of {len(rows)} contracts into {args.output}")
+    for error in errors:
+        logger.warning(f"Row {error.row} {error.field}: {error.message}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,193 @@
+import asyncio
+import csv
+import io
+import json
+import pathlib
+import zipfile
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from loguru import logger
+from pydantic import TypeAdapter, ValidationError
+
+from bot.document import RenderedPdf
+from bot.executor import render_executor
+from bot.models import ContractFormData
+from bot.templates import company_names
+from bot.utils import generate_pdf
+
+rows_adapter = TypeAdapter(List[ContractFormData])
+
+
+@dataclass
+class BatchRowError:
+    row: int
+    field: str
+    message: str
+
+
+@dataclass
+class BatchItem:
+    row: int
+    company_name: str
+    data: ContractFormData
+
+
+def read_rows(file_name: str, content: bytes) -> List[Dict[str, Any]]:
+    text = content.decode("utf-8-sig")
+    if file_name.lower().endswith(".json"):
+        rows = json.loads(text)
+        if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+            raise ValueError("JSON должен содержать список объектов")
+        return rows
+    dialect = csv.Sniffer().sniff(text.split("\n", 1)[0], delimiters=",;\t")
+    return list(csv.DictReader(io.StringIO(text), dialect=dialect))
+
+
+def validate_rows(
+    rows: List[Dict[str, Any]], default_company: Optional[str] = None
+) -> Tuple[List[BatchItem], List[BatchRowError]]:
+    errors: List[BatchRowError] = []
+    companies = [row.get("company_name") or default_company for row in rows]
+    known_companies = company_names()
+    for i, company_name in enumerate(companies):
+        if company_name not in known_companies:
+            errors.append(
+                BatchRowError(i + 1, "company_name", f"Неизвестная компания: {company_name}")
+            )
+
+    try:
+        validated = rows_adapter.validate_python(rows)
+    except ValidationError as e:
+        for error in e.errors():
+            row, *field = error["loc"]
+            errors.append(
+                BatchRowError(row + 1, ".".join(map(str, field)), error["msg"])
+            )
+        failed = {error.row - 1 for error in errors}
+        valid = [i for i in range(len(rows)) if i not in failed]
+        validated = dict(zip(valid, rows_adapter.validate_python([rows[i] for i in valid])))
+    else:
+        validated = dict(enumerate(validated))
+
+    failed = {error.row - 1 for error in errors}
+    items = [
+        BatchItem(i + 1, companies[i], data)
+        for i, data in validated.items()
+        if i not in failed
+    ]
+    return items, errors
+
+
+async def render_items(
+    items: List[BatchItem], owner_id: int | None = None
+) -> AsyncIterator[Tuple[BatchItem, RenderedPdf | Exception]]:
+    # Держим в работе не больше задач, чем процессов в пуле,
+    # чтобы пакет не упирался в лимит очереди рендера
+    pending = {}
+    queue = iter(items)
+    for item in queue:
+        task = asyncio.create_task(generate_pdf(item.data, item.company_name, owner_id))
+        pending[task] = item
+        if len(pending) >= render_executor.workers:
+            break
+    while pending:
+        done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            item = pending.pop(task)
+            try:
+                yield item, task.result()
+            except Exception as e:
+                yield item, e
+            next_item = next(queue, None)
+            if next_item is not None:
+                task = asyncio.create_task(
+                    generate_pdf(next_item.data, next_item.company_name, owner_id)
+                )
+                pending[task] = next_item
+
+
+class BatchArchive:
+    def __init__(
+        self,
+        path: pathlib.Path,
+        max_size: int | None = None,
+        on_volume: Callable[[pathlib.Path], Awaitable] | None = None,
+    ):
+        self.path = path
+        self.max_size = max_size
+        self.on_volume = on_volume
+        self.volumes: List[pathlib.Path] = []
+        self._zip: zipfile.ZipFile | None = None
+        self._size = 0
+
+    def _volume_path(self) -> pathlib.Path:
+        n = len(self.volumes) + 1
+        if n == 1:
+            return self.path
+        return self.path.with_name(f"{self.path.stem}.{n}{self.path.suffix}")
+
+    async def add(self, name: str, data: bytes):
+        if (
+            self._zip is not None
+            and self.max_size is not None
+            and self._size + len(data) > self.max_size
+        ):
+            await self.flush()
+        if self._zip is None:
+            path = self._volume_path()
+            self.volumes.append(path)
+            self._zip = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED)
+            self._size = 0
+        await asyncio.to_thread(self._zip.writestr, name, data)
+        self._size += len(data)
+
+    async def flush(self):
+        if self._zip is None:
+            return
+        self._zip.close()
+        self._zip = None
+        if self.on_volume is not None:
+            await self.on_volume(self.volumes[-1])
+
+
+def errors_report(errors: List[BatchRowError]) -> bytes:
+    report = io.StringIO()
+    writer = csv.writer(report)
+    writer.writerow(["row", "field", "error"])
+    for error in sorted(errors, key=lambda e: e.row):
+        writer.writerow([error.row, error.field, error.message])
+    return report.getvalue().encode("utf-8-sig")
+
+
+async def run_batch(
+    rows: List[Dict[str, Any]],
+    archive: BatchArchive,
+    default_company: Optional[str] = None,
+    owner_id: int | None = None,
+) -> Tuple[int, List[BatchRowError]]:
+    items, errors = validate_rows(rows, default_company)
+    rendered = 0
+    async for item, result in render_items(items, owner_id):
+        if isinstance(result, Exception):
+            logger.error(f"Batch row {item.row}: {result}")
+            errors.append(BatchRowError(item.row, "", str(result) or repr(result)))
+            continue
+        with result:
+            name = result.file_name.replace("/", "_")
+            await archive.add(f"{item.row:04d}. {name}.pdf", result.read())
+        rendered += 1
+    if errors:
+        await archive.add("errors.csv", errors_report(errors))
+    await archive.flush()
+    return rendered, errors
+
@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import os
+import pathlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Tuple
+
+from loguru import logger
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from bot.models import ContractFormData
+from bot.settings import get_redis, settings
+from bot.templates import LAYOUT_VERSION, get_template
+
+CachedPdf = Tuple[str, bytes]
+
+
+def template_version(contract_name: str) -> str:
+    # Хэш содержимого шаблона: правка текста, реквизитов или картинок
+    # меняет ключ, а повторное сохранение тех же файлов - нет
+    return (
+        f"{LAYOUT_VERSION}:{settings.pdf_profile}:{settings.pdf_image_dpi}:"
+        f"{get_template(contract_name).digest}"
+    )
+
+
+def render_key(data: ContractFormData, contract_name: str) -> str:
+    digest = hashlib.sha256()
+    digest.update(contract_name.encode())
+    digest.update(template_version(contract_name).encode())
+    digest.update(data.model_dump_json().encode())
+    return digest.hexdigest()
+
+
+def pack(file_name: str, pdf: bytes) -> bytes:
+    name = file_name.encode()
+    return len(name).to_bytes(2, "big") + name + pdf
+
+
+def unpack(blob: bytes) -> CachedPdf:
+    size = int.from_bytes(blob[:2], "big")
+    return blob[2 : 2 + size].decode(), blob[2 + size :]
+
+
+class RenderCache(ABC):
+    @abstractmethod
+    async def get(self, key: str) -> CachedPdf | None:
+        pass
+
+    @abstractmethod
+    async def set(self, key: str, file_name: str, pdf: bytes):
+        pass
+
+
+class NullRenderCache(RenderCache):
+    async def get(self, key: str) -> CachedPdf | None:
+        return None
+
+    async def set(self, key: str, file_name: str, pdf: bytes):
+        pass
+
+
+class MemoryRenderCache(RenderCache):
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.size = 0
+        self._items: OrderedDict[str, CachedPdf] = OrderedDict()
+
+    async def get(self, key: str) -> CachedPdf | None:
+        item = self._items.get(key)
+        if item is not None:
+            self._items.move_to_end(key)
+        return item
+
+    async def set(self, key: str, file_name: str, pdf: bytes):
+        if len(pdf) > self.max_size:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.size -= len(old[1])
+        self._items[key] = (file_name, pdf)
+        self.size += len(pdf)
+        while self.size > self.max_size:
+            _, (_, evicted) = self._items.popitem(last=False)
+            self.size -= len(evicted)
+
+
+class DiskRenderCache(RenderCache):
+    def __init__(self, path: pathlib.Path, max_size: int):
+        self.path = path
+        self.max_size = max_size
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.size = sum(f.stat().st_size for f in self.path.glob("*.bin"))
+
+    def _get(self, key: str) -> CachedPdf | None:
+        path = self.path.joinpath(f"{key}.bin")
+        try:
+            blob = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        # mtime служит отметкой последнего обращения для вытеснения
+        os.utime(path)
+        return unpack(blob)
+
+    def _set(self, key: str, file_name: str, pdf: bytes):
+        blob = pack(file_name, pdf)
+        if len(blob) > self.max_size:
+            return
+        path = self.path.joinpath(f"{key}.bin")
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_bytes(blob)
+        if path.exists():
+            self.size -= path.stat().st_size
+        os.replace(tmp_path, path)
+        self.size += len(blob)
+        if self.size > self.max_size:
+            self._evict()
+
+    def _evict(self):
+        files = sorted(self.path.glob("*.bin"), key=lambda f: f.stat().st_mtime_ns)
+        self.size = sum(f.stat().st_size for f in files)
+        for f in files:
+            if self.size <= self.max_size:
+                break
+            self.size -= f.stat().st_size
+            f.unlink(missing_ok=True)
+
+    async def get(self, key: str) -> CachedPdf | None:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, file_name: str, pdf: bytes):
+        await asyncio.to_thread(self._set, key, file_name, pdf)
+
+
+class RedisRenderCache(RenderCache):
+    def __init__(self, redis: Redis, max_size: int, ttl: int):
+        self.redis = redis
+        self.max_size = max_size
+        self.ttl = ttl
+
+    async def get(self, key: str) -> CachedPdf | None:
+        try:
+            blob = await self.redis.get(f"render:{key}")
+        except RedisError as e:
+            logger.warning(f"Render cache is unavailable: {e}")
+            return None
+        return unpack(blob) if blob is not None else None
+
+    async def set(self, key: str, file_name: str, pdf: bytes):
+        # Общий размер ограничивает maxmemory самого Redis, здесь - только TTL
+        if len(pdf) > self.max_size:
+            return
+        try:
+            await self.redis.set(f"render:{key}", pack(file_name, pdf), ex=self.ttl)
+        except RedisError as e:
+            logger.warning(f"Render cache is unavailable: {e}")
+
+
+@lru_cache(maxsize=None)
+def get_render_cache() -> RenderCache:
+    backend = settings.render_cache_backend
+    if backend == "redis":
+        redis = get_redis()
+        if redis is not None:
+            return RedisRenderCache(
+                redis, settings.render_cache_size, settings.render_cache_ttl
+            )
+        logger.warning("Redis storage is disabled, using memory render cache")
+        backend = "memory"
+    if backend == "disk":
+        return DiskRenderCache(
+            settings.render_cache_dir, settings.render_cache_size
+        )
+    if backend == "memory":
+        return MemoryRenderCache(settings.render_cache_size)
+    return NullRenderCache()
@@ -0,0 +1,91 @@
+import asyncio
+import heapq
+import itertools
+from contextlib import suppress
+from typing import Dict, Iterable, List, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+from loguru import logger
+
+from bot.settings import settings
+
+# Лимит Bot API на один вызов deleteMessages
+DELETE_BATCH_SIZE = 100
+
+_Entry = Tuple[float, int, Bot, int, List[int]]
+
+
+class CleanupScheduler:
+    # Одна фоновая задача удаляет сообщения по таймеру вместо sleep в хендлерах
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        self._heap: List[_Entry] = []
+        self._ready: List[_Entry] = []
+        self._seq = itertools.count()
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._heap) + len(self._ready)
+
+    def schedule(
+        self, bot: Bot, chat_id: int, message_ids: Iterable[int], delay: float
+    ):
+        loop = asyncio.get_running_loop()
+        entry = (loop.time() + delay, next(self._seq), bot, chat_id, list(message_ids))
+        heapq.heappush(self._heap, entry)
+        # При переполнении ближайшие по времени сообщения удаляются досрочно
+        while len(self._heap) > self.max_pending:
+            self._ready.append(heapq.heappop(self._heap))
+        task = self._task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+        self._wakeup.set()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._ready:
+                timeout = self._heap[0][0] - loop.time() if self._heap else None
+                with suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+            self._wakeup.clear()
+            now = loop.time()
+            while self._heap and self._heap[0][0] <= now:
+                self._ready.append(heapq.heappop(self._heap))
+            ready, self._ready = self._ready, []
+            try:
+                await self._delete(ready)
+            except asyncio.CancelledError:
+                # Недоудаленное отдаем shutdown
+                self._ready = ready + self._ready
+                raise
+
+    async def _delete(self, entries: List[_Entry]):
+        chats: Dict[Tuple[Bot, int], List[int]] = {}
+        for _, _, bot, chat_id, message_ids in entries:
+            chats.setdefault((bot, chat_id), []).extend(message_ids)
+        for (bot, chat_id), message_ids in chats.items():
+            for i in range(0, len(message_ids), DELETE_BATCH_SIZE):
+                try:
+                    await bot.delete_messages(
+                        chat_id, message_ids[i : i + DELETE_BATCH_SIZE]
+                    )
+                except TelegramAPIError as e:
+                    logger.warning(f"Messages in {chat_id} are not deleted: {e}")
+
+    async def shutdown(self):
+        # Оставшиеся сообщения удаляются сразу, не дожидаясь таймеров
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        entries, self._heap, self._ready = self._ready + self._heap, [], []
+        await self._delete(entries)
+
+
+cleanup_scheduler = CleanupScheduler(settings.cleanup_max_pending)
@@ -1,30 +1,32 @@
-import asyncio
 import json
-from contextlib import suppress
 from functools import wraps
 
-from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import Message
 from loguru import logger
 from pydantic_core import ValidationError
 
+from bot.cleanup import cleanup_scheduler
+from bot.metrics import observe_validation_error
+from bot.settings import settings
+
 
 def message_process_error(func):
     async def process_error(e, *args, **kwargs):
         message: Message = args[0]
         bot = message.bot
         if isinstance(e, ValidationError):
+            observe_validation_error(e)
             err_data = json.loads(e.json())
             e = f'Поле "{err_data[0]["loc"][0]}": {err_data[0]["msg"]}'
         message_answer = await message.answer(
             f"{e if e else 'Error'}",
         )
-        await asyncio.sleep(3)
-        with suppress(TelegramBadRequest):
-            for m_id in range(
-                message_answer.message_id - 1, message_answer.message_id + 1
-            ):
-                await bot.delete_message(message.from_user.id, m_id)
+        cleanup_scheduler.schedule(
+            bot,
+            message.chat.id,
+            [message.message_id, message_answer.message_id],
+            settings.error_message_ttl,
+        )
 
     @wraps(func)
     async def wrapper(*args, **kwargs):
@@ -0,0 +1,301 @@
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from contextlib import suppress
+from functools import lru_cache
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from aiogram.methods import GetUpdates, Response, TelegramMethod
+from aiogram.types import Message
+from aiohttp import ClientConnectorError
+from loguru import logger
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from bot.document import RenderedPdf
+from bot.metrics import render_stage_duration, telegram_retries, telegram_throttled
+from bot.settings import get_redis, settings
+from bot.throttling import RedisRateLimiter
+
+# Методы, на которые действуют лимиты Telegram на отправку сообщений
+SEND_METHODS = ("send", "edit", "copy", "forward")
+# Повтор этих методов не создает дубликатов, даже если Telegram уже выполнил
+# запрос, а ответ потерялся
+IDEMPOTENT_METHODS = ("get", "edit", "delete", "set")
+
+
+class MemoryFileIdStore:
+    def __init__(self, max_items: int = 10_000):
+        self.max_items = max_items
+        self._items: OrderedDict[str, str] = OrderedDict()
+
+    async def get(self, digest: str) -> str | None:
+        file_id = self._items.get(digest)
+        if file_id is not None:
+            self._items.move_to_end(digest)
+        return file_id
+
+    async def set(self, digest: str, file_id: str):
+        self._items[digest] = file_id
+        self._items.move_to_end(digest)
+        if len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    async def delete(self, digest: str):
+        self._items.pop(digest, None)
+
+
+class RedisFileIdStore:
+    def __init__(self, redis: Redis, ttl: int):
+        self.redis = redis
+        self.ttl = ttl
+
+    async def get(self, digest: str) -> str | None:
+        try:
+            file_id = await self.redis.get(f"file_id:{digest}")
+        except RedisError as e:
+            logger.warning(f"file_id store is unavailable: {e}")
+            return None
+        return file_id.decode() if file_id is not None else None
+
+    async def set(self, digest: str, file_id: str):
+        try:
+            await self.redis.set(f"file_id:{digest}", file_id, ex=self.ttl)
+        except RedisError as e:
+            logger.warning(f"file_id store is unavailable: {e}")
+
+    async def delete(self, digest: str):
+        try:
+            await self.redis.delete(f"file_id:{digest}")
+        except RedisError as e:
+            logger.warning(f"file_id store is unavailable: {e}")
+
+
+@lru_cache(maxsize=None)
+def get_file_ids() -> MemoryFileIdStore | RedisFileIdStore:
+    redis = get_redis()
+    if redis is not None:
+        return RedisFileIdStore(redis, settings.file_id_ttl)
+    return MemoryFileIdStore()
+
+
+async def send_document(bot: Bot, chat_id: int, document: RenderedPdf) -> Message:
+    started = time.perf_counter()
+    try:
+        return await _send_document(bot, chat_id, document)
+    finally:
+        render_stage_duration.labels("upload").observe(time.perf_counter() - started)
+
+
+async def _send_document(bot: Bot, chat_id: int, document: RenderedPdf) -> Message:
+    digest = document.digest
+    file_ids = get_file_ids()
+    file_id = await file_ids.get(digest)
+    if file_id is not None:
+        try:
+            return await bot.send_document(chat_id, file_id)
+        except TelegramBadRequest as e:
+            # Telegram мог забыть файл - загружаем заново
+            logger.warning(f"file_id of {digest} was rejected: {e}")
+            await file_ids.delete(digest)
+
+    sent = await bot.send_document(chat_id, document.input_file())
+    await file_ids.set(digest, sent.document.file_id)
+    return sent
+
+
+async def edit_status(status: Message, text: str):
+    # Текст мог не измениться, а сообщение - быть удалено пользователем
+    with suppress(TelegramBadRequest):
+        await status.edit_text(text)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.ts = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+
+    def reserve(self) -> float:
+        # Токен берется в долг: запросы встают в очередь без блокировок,
+        # а каждый ждет, пока долг не погасится
+        self._refill()
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    def block(self, seconds: float):
+        # Следующий reserve вернет ровно seconds
+        self._refill()
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class SendGovernor:
+    # Общий лимит бота и лимит на чат: запросы ждут своей очереди
+    # здесь, а не получают 429 от Telegram
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        chat_rate: float,
+        chat_burst: int,
+        max_chats: int = 10_000,
+        redis: Redis | None = None,
+    ):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_chats = max_chats
+        self._global = TokenBucket(rate, burst)
+        # Общий лимит делят все реплики бота и воркеры рендера, поэтому с Redis
+        # он считается там, а локальный bucket остается на случай его отказа
+        self._shared = None
+        if redis is not None:
+            self._shared = RedisRateLimiter(redis, rate, burst, prefix="telegram")
+        self._chats: OrderedDict[int | str, TokenBucket] = OrderedDict()
+
+    def _chat(self, chat_id: int | str) -> TokenBucket:
+        bucket = self._chats.pop(chat_id, None)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+        self._chats[chat_id] = bucket
+        if len(self._chats) > self.max_chats:
+            self._chats.popitem(last=False)
+        return bucket
+
+    async def acquire(self, chat_id: int | str):
+        delay = self._chat(chat_id).reserve()
+        if self._shared is None:
+            delay = max(delay, self._global.reserve())
+        await self._wait(delay)
+        if self._shared is not None:
+            await self._acquire_shared()
+
+    async def _acquire_shared(self):
+        while True:
+            try:
+                limit = await self._shared.take("send")
+            except RedisError as e:
+                logger.warning(f"Shared send limit is unavailable: {e}")
+                await self._wait(self._global.reserve())
+                return
+            if limit.allowed:
+                return
+            # Освободившийся токен достается одному из ожидающих,
+            # разброс не дает всем им опрашивать Redis одновременно
+            await self._wait(limit.retry_after * random.uniform(1, 1.5))
+
+    @staticmethod
+    async def _wait(delay: float):
+        if delay > 0:
+            telegram_throttled.inc(delay)
+            await asyncio.sleep(delay)
+
+    def block(self, chat_id: int | str, seconds: float):
+        self._chat(chat_id).block(seconds)
+
+
+class RetryMiddleware(BaseRequestMiddleware):
+    def __init__(
+        self,
+        governor: SendGovernor,
+        max_retries: int,
+        backoff: float,
+        max_backoff: float,
+    ):
+        self.governor = governor
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+    ) -> Response:
+        # Long polling повторяет запросы сам
+        if isinstance(method, GetUpdates):
+            return await make_request(bot, method)
+        chat_id = None
+        if method.__api_method__.startswith(SEND_METHODS):
+            chat_id = getattr(method, "chat_id", None)
+        attempt = 0
+        while True:
+            if chat_id is not None:
+                await self.governor.acquire(chat_id)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                reason, delay = "retry_after", float(e.retry_after)
+                if chat_id is not None:
+                    # Остальные запросы в этот чат тоже ждут, а не ловят 429
+                    self.governor.block(chat_id, delay)
+                    delay = 0
+            except (TelegramNetworkError, TelegramServerError) as e:
+                if attempt >= self.max_retries or not self.can_retry(method, e):
+                    raise
+                reason = type(e).__name__
+                delay = min(self.max_backoff, self.backoff * 2**attempt)
+                delay *= random.uniform(0.5, 1)
+            attempt += 1
+            telegram_retries.labels(reason).inc()
+            logger.warning(
+                f"{method.__api_method__} failed ({reason}), retry {attempt} "
+                f"of {self.max_retries}"
+            )
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def can_retry(
+        method: TelegramMethod, error: TelegramNetworkError | TelegramServerError
+    ) -> bool:
+        if method.__api_method__.startswith(IDEMPOTENT_METHODS):
+            return True
+        # Отправку повторяем, только если соединение не установилось и запрос
+        # точно не ушел: после таймаута или 5xx сообщение могло уже дойти
+        return isinstance(error.__context__, ClientConnectorError)
+
+
+def create_session() -> AiohttpSession:
+    api = PRODUCTION
+    if settings.telegram_api_url:
+        api = TelegramAPIServer.from_base(settings.telegram_api_url)
+    session = AiohttpSession(api=api, limit=settings.telegram_connections)
+    # Соединения с Bot API переиспользуются дольше 15 с по умолчанию aiohttp
+    session._connector_init["keepalive_timeout"] = settings.telegram_keepalive
+    governor = SendGovernor(
+        settings.telegram_send_rate,
+        settings.telegram_send_burst,
+        settings.telegram_chat_rate,
+        settings.telegram_chat_burst,
+        redis=get_redis(),
+    )
+    session.middleware(
+        RetryMiddleware(
+            governor,
+            max_retries=settings.telegram_max_retries,
+            backoff=settings.telegram_retry_backoff,
+            max_backoff=settings.telegram_retry_max_backoff,
+        )
+    )
+    return session
@@ -0,0 +1,63 @@
+import hashlib
+import os
+import time
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import TYPE_CHECKING, Dict
+
+if TYPE_CHECKING:
+    from aiogram.types import InputFile
+
+# Модуль импортируется и ботом, и процессами рендера, поэтому не зависит
+# ни от aiogram, ни от ReportLab
+
+
+class StageTimer:
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self._last = time.perf_counter()
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0) + now - self._last
+        self._last = now
+
+
+@dataclass
+class RenderedPdf:
+    file_name: str
+    data: bytes | None = None
+    path: str | None = None
+    timings: Dict[str, float] = field(default_factory=dict)
+    size: int = 0
+
+    def input_file(self) -> "InputFile":
+        from aiogram.types import BufferedInputFile, FSInputFile
+
+        if self.path is not None:
+            return FSInputFile(self.path, filename=f"{self.file_name}.pdf")
+        return BufferedInputFile(self.data, filename=f"{self.file_name}.pdf")
+
+    @cached_property
+    def digest(self) -> str:
+        return hashlib.sha256(self.read()).hexdigest()
+
+    def read(self) -> bytes:
+        if self.path is not None:
+            with open(self.path, "rb") as f:
+                return f.read()
+        return self.data
+
+    def cleanup(self):
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cleanup()
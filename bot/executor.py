@@ -0,0 +1,189 @@
+import asyncio
+import importlib
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Awaitable, Callable, Dict, Set
+
+from loguru import logger
+
+from bot.document import RenderedPdf
+from bot.metrics import render_backlog, render_rejected
+from bot.settings import settings
+
+
+class RenderQueueFull(Exception):
+    pass
+
+
+class RenderCancelled(Exception):
+    pass
+
+
+def discard_result(job: Future):
+    if job.cancelled() or job.exception() is not None:
+        return
+    result = job.result()
+    if isinstance(result, RenderedPdf):
+        result.cleanup()
+
+
+class RenderExecutor:
+    def __init__(
+        self,
+        workers: int,
+        queue_size: int,
+        timeout: float,
+        initializer: Callable | str | None = None,
+        max_backlog: int | None = None,
+    ):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.initializer = initializer
+        self.max_backlog = max_backlog
+        # Принятые и еще не завершенные задачи, включая ожидающие слот
+        self._pending = 0
+        # Рабочие процессы + очередь ожидания: остальные вызовы ждут свободный слот
+        self._slots = asyncio.Semaphore(workers + queue_size)
+        self._pool: ProcessPoolExecutor | None = None
+        self._jobs: Dict[int, Set[asyncio.Future]] = {}
+        self._cancelled: Set[asyncio.Future] = set()
+        # Задачи, результат которых уже никто не ждет
+        self._abandoned: Set[Future] = set()
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            initializer = self.initializer
+            if isinstance(initializer, str):
+                # "модуль:функция" импортируется только при запуске пула,
+                # а рабочие процессы загружают лишь этот модуль
+                module, name = initializer.split(":")
+                initializer = getattr(importlib.import_module(module), name)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=initializer,
+            )
+        return self._pool
+
+    @property
+    def backlog(self) -> int:
+        return max(0, self._pending - self.workers)
+
+    async def submit(
+        self,
+        owner_id: int | None,
+        func: Callable,
+        *args,
+        on_queued: Callable[[int], Awaitable[Any]] | None = None,
+    ) -> Any:
+        # Задачи сверх порога отклоняются сразу, а не ждут таймаута
+        if self.max_backlog is not None and self.backlog >= self.max_backlog:
+            render_rejected.inc()
+            raise RenderQueueFull(f"Render backlog is full ({self.backlog} jobs)")
+        self._pending += 1
+        render_backlog.set(self.backlog)
+        try:
+            if on_queued is not None and self.backlog:
+                await on_queued(self.backlog)
+            return await self._submit(owner_id, func, *args)
+        finally:
+            self._pending -= 1
+            render_backlog.set(self.backlog)
+
+    async def _submit(self, owner_id: int | None, func: Callable, *args) -> Any:
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise RenderQueueFull(
+                f"Render queue is full ({self.workers + self.queue_size} jobs)"
+            )
+        try:
+            job = self.pool.submit(func, *args)
+        except BaseException as e:
+            self._slots.release()
+            if isinstance(e, BrokenProcessPool):
+                self._pool = None
+            raise
+        # Задача, уже запущенная в процессе, не прерывается по таймауту или
+        # отмене: слот держится, пока процесс действительно не освободится
+        loop = asyncio.get_running_loop()
+        job.add_done_callback(lambda job: self._call_soon(loop, self._job_done, job))
+        future = asyncio.wrap_future(job)
+        self._jobs.setdefault(owner_id, set()).add(future)
+        received = False
+        try:
+            result = await asyncio.wait_for(future, self.timeout)
+            received = True
+            return result
+        except BrokenProcessPool:
+            # Пул с упавшим процессом больше не принимает задачи - пересоздаем
+            self._pool = None
+            raise
+        except asyncio.CancelledError:
+            if future in self._cancelled:
+                raise RenderCancelled(f"Render for {owner_id} was cancelled")
+            raise
+        finally:
+            if not received:
+                # Документ, готовый после таймаута или отмены, некому удалить
+                if job.done():
+                    discard_result(job)
+                else:
+                    self._abandoned.add(job)
+            self._cancelled.discard(future)
+            jobs = self._jobs.get(owner_id)
+            if jobs is not None:
+                jobs.discard(future)
+                if not jobs:
+                    del self._jobs[owner_id]
+
+    def _job_done(self, job: Future):
+        self._slots.release()
+        if job in self._abandoned:
+            self._abandoned.discard(job)
+            discard_result(job)
+
+    @staticmethod
+    def _call_soon(loop: asyncio.AbstractEventLoop, callback: Callable, *args):
+        # Колбэки задач вызываются из потока пула
+        try:
+            loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            # Цикл событий уже закрыт - слоты больше никому не нужны
+            pass
+
+    async def warm_up(self):
+        # Пул запускает по процессу на каждую задачу, пока нет свободных,
+        # так что одновременные пустые задачи поднимают все процессы сразу
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(loop.run_in_executor(self.pool, int) for _ in range(self.workers))
+        )
+        logger.info(f"Render executor is warmed up ({self.workers} workers)")
+
+    def cancel(self, owner_id: int | None) -> int:
+        jobs = self._jobs.get(owner_id, set())
+        for future in jobs:
+            self._cancelled.add(future)
+            future.cancel()
+        if jobs:
+            logger.info(f"Cancelled {len(jobs)} render job(s) of {owner_id}")
+        return len(jobs)
+
+    async def shutdown(self):
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            # Ожидание процессов не должно блокировать цикл событий
+            await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
+
+
+render_executor = RenderExecutor(
+    workers=settings.render_workers,
+    queue_size=settings.render_queue_size,
+    timeout=settings.render_timeout,
+    initializer="bot.static_layer:compile_static_layers",
+    max_backlog=settings.render_max_backlog,
+)
@@ -0,0 +1,44 @@
+import pathlib
+from typing import Dict
+
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+fonts_path = pathlib.Path(__file__).parent.joinpath("font/freesans")
+
+FONTS: Dict[str, str] = {
+    "FreeSans": "FreeSans.ttf",
+    "FreeSansBold": "FreeSansBold.ttf",
+    "FreeSansOblique": "FreeSansOblique.ttf",
+    "FreeSansBoldOblique": "FreeSansBoldOblique.ttf",
+}
+
+# Шрифты и символы данных договора. Коды для них назначаются в статическом
+# слое, поэтому подмножества шрифтов одинаковы во всех документах
+DYNAMIC_FONTS = ("FreeSans",)
+DYNAMIC_CHARSET = (
+    "".join(map(chr, range(32, 127)))
+    + "АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯабвгдеёжзийклмнопрстуфхцчшщъыьэюя"
+    + "№«»—–…‘’“”•°×→"
+)
+
+
+def register_fonts() -> None:
+    registered = set(pdfmetrics.getRegisteredFontNames())
+    if registered.issuperset(FONTS):
+        return
+    for name, file_name in FONTS.items():
+        if name not in registered:
+            pdfmetrics.registerFont(TTFont(name, fonts_path.joinpath(file_name)))
+    pdfmetrics.registerFontFamily(
+        "FreeSans",
+        normal="FreeSans",
+        bold="FreeSansBold",
+        italic="FreeSansOblique",
+        boldItalic="FreeSansBoldOblique",
+    )
+
+
+def get_font(name: str) -> TTFont:
+    register_fonts()
+    return pdfmetrics.getFont(name)
@@ -1,14 +1,42 @@
-from aiogram import Router, types
-from aiogram.filters import Command
+import asyncio
+import pathlib
+import tempfile
+from contextlib import suppress
+from typing import Any, Dict, List
+
+from aiogram import F, Router
+from aiogram.exceptions import TelegramAPIError
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import Message
+from aiogram.types import FSInputFile, Message
 from loguru import logger
+from pydantic import ValidationError
+from redis.exceptions import RedisError
 
+from bot.batch.batch import BatchArchive, read_rows, run_batch
 from bot.decorators import message_process_error
+from bot.delivery import edit_status, send_document
+from bot.executor import RenderCancelled, RenderQueueFull, render_executor
+from bot.jobs import RenderJob, get_job_queue
+from bot.lifecycle import lifecycle
+from bot.messages import DONE_MESSAGE, ERROR_MESSAGE, OVERLOAD_MESSAGE
+from bot.metrics import observe_validation_error
 from bot.models import ContractFormData
-from bot.settings import bot, settings
-from bot.utils import ask_next_state, generate_pdf, validate_state_data
+from bot.quick import (
+    QUICK_PROMPT,
+    parse_quick_message,
+    parse_web_app_data,
+    validation_errors,
+)
+from bot.settings import settings
+from bot.templates import company_names
+from bot.utils import (
+    FormValidators,
+    ask_next_state,
+    contract_from_state,
+    generate_pdf,
+)
 
 form_router = Router()
 
@@ -29,8 +57,30 @@ class Form(StatesGroup):
     sbp_bank = State()
 
 
+class BatchForm(StatesGroup):
+    file = State()
+
+
+class QuickForm(StatesGroup):
+    data = State()
+
+
+form_validators = FormValidators(Form)
+
+
+async def cancel_renders(user_id: int):
+    render_executor.cancel(user_id)
+    job_queue = get_job_queue()
+    if job_queue is not None:
+        try:
+            await job_queue.cancel(user_id)
+        except RedisError as e:
+            logger.warning(f"Queued renders of {user_id} are not cancelled: {e}")
+
+
 @form_router.message(Command("start"))
 async def start(message: Message, state: FSMContext):
+    await cancel_renders(message.from_user.id)
     await state.clear()
     commands = [f"{x.command} - {x.description}" for x in settings.bot_commands]
     commands_text = '\n'.join(commands)
@@ -43,133 +93,332 @@ async def create_contract(message: Message, state: FSMContext):
     if "/company_" not in message.text:
         return
     company_name = message.text.replace("/company_", "")
-    await state.update_data({"company_name": company_name})
     await message.reply(f"Выбрана компания: {company_name}")
-    await ask_next_state(message, state, Form.date, "Введите дату договора:")
+    await ask_next_state(
+        message,
+        state,
+        Form.date,
+        "Введите дату договора:",
+        company_name=company_name,
+        items=[],
+    )
+
+
+@form_router.message(Command("batch"))
+async def batch(message: Message, state: FSMContext, command: CommandObject):
+    await state.clear()
+    await state.set_state(BatchForm.file)
+    await state.update_data(company_name=command.args)
+    await message.answer(
+        "Отправьте CSV или JSON файл с данными договоров.\n"
+        "Компания указывается в колонке company_name или аргументом /batch <компания>"
+    )
+
+
+@form_router.message(BatchForm.file, F.document)
+async def process_batch_file(message: Message, state: FSMContext):
+    data = await state.get_data()
+    await state.clear()
+    try:
+        file = await message.bot.download(message.document)
+        rows = read_rows(message.document.file_name or "", file.read())
+    except Exception as e:
+        logger.error(e)
+        await message.answer(f"Не удалось прочитать файл: {e}")
+        return
+    if len(rows) > settings.batch_max_rows:
+        await message.answer(f"Слишком много строк, максимум {settings.batch_max_rows}")
+        return
+
+    await message.answer(f"Строк в файле: {len(rows)}. Пожалуйста, ожидайте...")
+
+    async def send_volume(path: pathlib.Path):
+        try:
+            await message.answer_document(FSInputFile(path))
+        finally:
+            path.unlink(missing_ok=True)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        archive = BatchArchive(
+            pathlib.Path(tmp_dir).joinpath("contracts.zip"),
+            max_size=settings.batch_volume_size,
+            on_volume=send_volume,
+        )
+        async with lifecycle.render():
+            rendered, errors = await run_batch(
+                rows, archive, data.get("company_name"), message.from_user.id
+            )
+    await message.answer(
+        f"Готово: {rendered} из {len(rows)}. Ошибок: {len(errors)}"
+        + ("\nПодробности в errors.csv" if errors else "")
+    )
 
 
 @form_router.message(Command("clear_context"))
 async def clear_context(message: Message, state: FSMContext):
+    await cancel_renders(message.from_user.id)
     await state.clear()
     await message.reply("Контекст очищен")
 
 
 @form_router.message(Form.date)
 async def process_date(message: Message, state: FSMContext):
-    await validate_state_data(state, message)
-    await state.update_data(date=message.text)
+    date = form_validators.validate(Form.date, message.text)
     await ask_next_state(
-        message, state, Form.contract_number, "Введите номер договора:"
+        message, state, Form.contract_number, "Введите номер договора:", date=date
     )
 
 
 @form_router.message(Form.contract_number)
 async def process_contract_number(message: Message, state: FSMContext):
-    await validate_state_data(state, message)
-    await state.update_data(contract_number=message.text)
-    await ask_next_state(message, state, Form.first_name, "Введите имя:")
+    contract_number = form_validators.validate(Form.contract_number, message.text)
+    await ask_next_state(
+        message, state, Form.first_name, "Введите имя:", contract_number=contract_number
+    )
 
 
 @form_router.message(Form.first_name)
 async def process_first_name(message: Message, state: FSMContext):
-    await validate_state_data(state, message)
-    await state.update_data(first_name=message.text)
-    await ask_next_state(message, state, Form.last_name, "Введите фамилию:")
+    first_name = form_validators.validate(Form.first_name, message.text)
+    await ask_next_state(
+        message, state, Form.last_name, "Введите фамилию:", first_name=first_name
+    )
 
 
 @form_router.message(Form.last_name)
 async def process_last_name(message: Message, state: FSMContext):
-    await validate_state_data(state, message)
-    await state.update_data(last_name=message.text)
+    last_name = form_validators.validate(Form.last_name, message.text)
     await ask_next_state(
-        message, state, Form.middle_name, "Введите отчество (если нет, напишите '-'):"
+        message,
+        state,
+        Form.middle_name,
+        "Введите отчество (если нет, напишите '-'):",
+        last_name=last_name,
     )
 
 
 @form_router.message(Form.middle_name)
 async def process_middle_name(message: Message, state: FSMContext):
-    await validate_state_data(state, message)
-    await state.update_data(middle_name=message.text)
-    await ask_next_state(message, state, Form.phone, "Введите телефон:")
+    middle_name = form_validators.validate(Form.middle_name, message.text)
+    await ask_next_state(
+        message, state, Form.phone, "Введите телефон:", middle_name=middle_name
+    )
 
 
 @form_router.message(Form.phone)
 @message_process_error
 async def process_phone(message: Message, state: FSMContext):
-    await validate_state_data(state, message)
-    await state.update_data(phone=message.text)
-    await ask_next_state(message, state, Form.address, "Введите адрес:")
+    phone = form_validators.validate(Form.phone, message.text)
+    await ask_next_state(message, state, Form.address, "Введите адрес:", phone=phone)
 
 
 @form_router.message(Form.address)
 async def process_address(message: Message, state: FSMContext):
-    await validate_state_data(state, message)
-    await state.update_data(address=message.text)
-    await ask_next_state(message, state, Form.ordered_item, "Введите заказанный товар:")
+    address = form_validators.validate(Form.address, message.text)
+    await ask_next_state(
+        message, state, Form.ordered_item, "Введите заказанный товар:", address=address
+    )
 
 
 @form_router.message(Form.ordered_item)
+@message_process_error
 async def process_ordered_item(message: Message, state: FSMContext):
-    await validate_state_data(state, message)
-    await state.update_data(ordered_item=message.text)
-    await ask_next_state(message, state, Form.quantity, "Введите количество:")
+    ordered_item = form_validators.validate(Form.ordered_item, message.text)
+    await ask_next_state(
+        message, state, Form.quantity, "Введите количество:", ordered_item=ordered_item
+    )
 
 
 @form_router.message(Form.quantity)
 @message_process_error
 async def process_quantity(message: Message, state: FSMContext):
-    await validate_state_data(state, message)
-    await state.update_data(quantity=message.text)
-    await ask_next_state(message, state, Form.cost, "Введите стоимость:")
+    quantity = form_validators.validate(Form.quantity, message.text)
+    await ask_next_state(
+        message, state, Form.cost, "Введите стоимость:", quantity=quantity
+    )
 
 
 @form_router.message(Form.cost)
 @message_process_error
 async def process_cost(message: Message, state: FSMContext):
-    await validate_state_data(state, message)
-    await state.update_data(cost=message.text)
+    cost = form_validators.validate(Form.cost, message.text)
+    data = await state.get_data()
+    item = {"name": data["ordered_item"], "quantity": data["quantity"], "cost": cost}
     await ask_next_state(
-        message, state, Form.sbp_phone, "Введите номер телефона (СБП):"
+        message,
+        state,
+        Form.sbp_phone,
+        "Введите номер телефона (СБП):\nДобавить еще товар /add_item",
+        cost=cost,
+        items=[*data.get("items", []), item],
     )
 
 
+@form_router.message(Form.sbp_phone, Command("add_item"))
+async def add_item(message: Message, state: FSMContext):
+    await ask_next_state(message, state, Form.ordered_item, "Введите заказанный товар:")
+
+
 @form_router.message(Form.sbp_phone)
 @message_process_error
 async def process_sbp_phone(message: Message, state: FSMContext):
-    await validate_state_data(state, message)
-    await state.update_data(sbp_phone=message.text)
-    await ask_next_state(message, state, Form.sbp_full_name, "Введите ФИО (СБП):")
+    sbp_phone = form_validators.validate(Form.sbp_phone, message.text)
+    await ask_next_state(
+        message, state, Form.sbp_full_name, "Введите ФИО (СБП):", sbp_phone=sbp_phone
+    )
 
 
 @form_router.message(Form.sbp_full_name)
 async def process_sbp_full_name(message: Message, state: FSMContext):
-    await validate_state_data(state, message)
-    await state.update_data(sbp_full_name=message.text)
-    await ask_next_state(message, state, Form.sbp_bank, "Введите банк (СБП):")
+    sbp_full_name = form_validators.validate(Form.sbp_full_name, message.text)
+    await ask_next_state(
+        message,
+        state,
+        Form.sbp_bank,
+        "Введите банк (СБП):",
+        sbp_full_name=sbp_full_name,
+    )
 
 
 @form_router.message(Form.sbp_bank)
 @form_router.message(Command("retry"))
 async def process_sbp_bank(message: Message, state: FSMContext):
-    await validate_state_data(state, message)
-    await state.update_data(sbp_bank=message.text)
+    if not message.text.startswith("/"):
+        await state.update_data(
+            sbp_bank=form_validators.validate(Form.sbp_bank, message.text)
+        )
     data = await state.get_data()
-    error_msg = f"Произошла ошибка. Попробуйте еще раз /retry.\nСбросить текущее состояние /start"
     try:
-        contract_data = ContractFormData(**data)
-        await bot.send_message(message.chat.id, "Пожалуйста, ожидайте...")
+        contract_data = contract_from_state(data)
+    except Exception as e:
+        logger.error(f"Ошибка: {e}")
+        await message.answer(ERROR_MESSAGE)
+        return
+    await send_contract(message, state, contract_data, data.get("company_name"))
+
+
+async def send_contract(
+    message: Message,
+    state: FSMContext,
+    contract_data: ContractFormData,
+    company_name: str,
+):
+    bot = message.bot
+    chat_id = message.chat.id
+    job = RenderJob.create(chat_id, message.from_user.id, company_name, contract_data)
+    job.fsm_state = await state.get_state()
+
+    async def send_status() -> Message:
+        status = await bot.send_message(chat_id, "Пожалуйста, ожидайте...")
+        job.status_message_id = status.message_id
+        return status
+
+    # Статус отправляется, пока договор рендерится
+    status_sent = asyncio.create_task(send_status())
+
+    async def set_status(text: str):
         try:
-            doc_name, file = await generate_pdf(contract_data, data.get("company_name"))
-            file_buffered = types.FSInputFile(file.name, filename=f"{doc_name}.pdf")
-            await message.answer_document(file_buffered)
-            await state.clear()
+            status = await status_sent
+        except TelegramAPIError:
+            await bot.send_message(chat_id, text)
+        else:
+            await edit_status(status, text)
+
+    job_queue = get_job_queue()
+    if job_queue is not None:
+        # Рендер и отправку выполняет воркер, состояние он очистит сам.
+        # Если статус не отправился, воркер пришлет свои сообщения отдельно
+        with suppress(TelegramAPIError):
+            await status_sent
+        try:
+            backlog = await job_queue.admit()
+            if not await job_queue.enqueue(job):
+                await set_status("Этот договор уже генерируется")
+            elif backlog:
+                await set_status(f"Ваше место в очереди: {backlog + 1}")
+            return
+        except RedisError as e:
+            logger.warning(f"Render queue is unavailable, rendering inline: {e}")
+        except RenderQueueFull as e:
+            logger.warning(e)
+            await set_status(OVERLOAD_MESSAGE)
+            return
         except Exception as e:
             logger.error(e)
-            await bot.send_message(message.chat.id, error_msg)
-        else:
-            await bot.send_message(
-                message.chat.id, "Для генерации нового файла нажмите /start"
+            await set_status(ERROR_MESSAGE)
+            return
+
+    async def on_queued(position: int):
+        await set_status(f"Ваше место в очереди: {position}")
+
+    try:
+        # При остановке бота рендер дожидается, а недоделанный уходит в очередь
+        async with lifecycle.render(job):
+            document = await generate_pdf(
+                contract_data, company_name, message.from_user.id, on_queued
             )
+            with document:
+                # Итоговый статус правится одновременно с загрузкой документа,
+                # при ошибке загрузки его перезапишет сообщение об ошибке
+                sent, _ = await asyncio.gather(
+                    send_document(bot, chat_id, document),
+                    set_status(DONE_MESSAGE),
+                    return_exceptions=True,
+                )
+            if isinstance(sent, BaseException):
+                raise sent
+            await state.clear()
+    except RenderCancelled:
+        return
+    except RenderQueueFull as e:
+        logger.warning(e)
+        await set_status(OVERLOAD_MESSAGE)
     except Exception as e:
-        logger.error(f"Ошибка: {e}")
-        await message.answer(error_msg)
+        logger.error(e)
+        await set_status(ERROR_MESSAGE)
+
+
+@form_router.message(Command("quick"))
+async def quick(message: Message, state: FSMContext, command: CommandObject):
+    if not command.args:
+        await ask_next_state(message, state, QuickForm.data, QUICK_PROMPT)
+        return
+    await submit_quick_form(message, state, *parse_quick_message(command.args))
+
+
+@form_router.message(QuickForm.data, F.text, ~F.text.startswith("/"))
+async def process_quick_form(message: Message, state: FSMContext):
+    await submit_quick_form(message, state, *parse_quick_message(message.text))
+
+
+@form_router.message(F.web_app_data)
+async def process_web_app_data(message: Message, state: FSMContext):
+    await submit_quick_form(
+        message, state, *parse_web_app_data(message.web_app_data.data)
+    )
+
+
+async def submit_quick_form(
+    message: Message, state: FSMContext, fields: Dict[str, Any], errors: List[str]
+):
+    # Вся форма проверяется одним вызовом, ошибки отправляются одним сообщением
+    data = await state.get_data()
+    company_name = fields.pop("company_name", None) or data.get("company_name")
+    if company_name not in company_names():
+        errors.insert(0, f"компания: укажите одну из {', '.join(company_names())}")
+    try:
+        contract_data = ContractFormData.model_validate(fields)
+    except ValidationError as e:
+        observe_validation_error(e)
+        errors.extend(validation_errors(e))
+    if errors:
+        await state.set_state(QuickForm.data)
+        await message.answer("\n".join(["Исправьте и отправьте еще раз:", *errors]))
+        return
+
+    # Данные сохраняются одной записью, чтобы работал /retry
+    await state.set_data(
+        {**contract_data.model_dump(exclude_none=True), "company_name": company_name}
+    )
+    await state.set_state(None)
+    await send_contract(message, state, contract_data, company_name)
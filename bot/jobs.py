@@ -0,0 +1,207 @@
+import hashlib
+import time
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from loguru import logger
+from pydantic import BaseModel, Field, ValidationError
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+
+from bot.cache import render_key
+from bot.executor import RenderQueueFull
+from bot.metrics import render_rejected
+from bot.models import ContractFormData
+from bot.settings import get_redis, settings
+
+STREAM = "render_jobs"
+DEAD_STREAM = "render_jobs:dead"
+GROUP = "render_workers"
+
+
+class RenderJob(BaseModel):
+    key: str
+    chat_id: int
+    user_id: int
+    company_name: str
+    data: ContractFormData
+    status_message_id: int | None = None
+    # Состояние формы при отправке: воркер очищает только ее, а не новую
+    fsm_state: str | None = None
+    attempt: int = 1
+    created: float = Field(default_factory=time.time)
+
+    @classmethod
+    def create(
+        cls,
+        chat_id: int,
+        user_id: int,
+        company_name: str,
+        data: ContractFormData,
+        status_message_id: int | None = None,
+    ) -> "RenderJob":
+        # Один и тот же договор одного пользователя - одна задача в очереди
+        key = f"{user_id}:{render_key(data, company_name)}"
+        return cls(
+            key=hashlib.sha256(key.encode()).hexdigest(),
+            chat_id=chat_id,
+            user_id=user_id,
+            company_name=company_name,
+            data=data,
+            status_message_id=status_message_id,
+        )
+
+
+class JobQueue:
+    # Задачи хранятся в Redis stream: сообщение подтверждается только после
+    # отправки документа, поэтому задачи упавшего воркера не теряются
+    def __init__(
+        self,
+        redis: Redis,
+        max_attempts: int,
+        claim_idle: float,
+        dedup_ttl: int,
+        max_backlog: int | None = None,
+    ):
+        self.redis = redis
+        self.max_attempts = max_attempts
+        self.claim_idle = claim_idle
+        self.dedup_ttl = dedup_ttl
+        self.max_backlog = max_backlog
+        self._ready = False
+
+    async def setup(self):
+        try:
+            await self.redis.xgroup_create(STREAM, GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._ready = True
+
+    async def backlog(self) -> int:
+        # Завершенные задачи удаляются из потока, поэтому его длина - это
+        # ожидающие задачи и уже выданные воркерам (pending)
+        if not self._ready:
+            await self.setup()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            length, pending = await pipe.xlen(STREAM).xpending(STREAM, GROUP).execute()
+        return max(0, length - pending["pending"])
+
+    async def admit(self) -> int:
+        # Как и у пула рендера, задачи сверх порога отклоняются сразу.
+        # Возвращает число задач, ожидающих воркера перед новой
+        backlog = await self.backlog()
+        if self.max_backlog is not None and backlog >= self.max_backlog:
+            render_rejected.inc()
+            raise RenderQueueFull(f"Render queue backlog is full ({backlog} jobs)")
+        return backlog
+
+    async def enqueue(self, job: RenderJob) -> bool:
+        if not await self.redis.set(
+            f"{STREAM}:key:{job.key}", job.created, nx=True, ex=self.dedup_ttl
+        ):
+            return False
+        await self.redis.xadd(STREAM, {"job": job.model_dump_json()})
+        return True
+
+    async def read(
+        self, consumer: str, count: int, block: int | None = None
+    ) -> List[Tuple[bytes, RenderJob]]:
+        # Задачи, зависшие у остановившихся воркеров, возвращаются в очередь
+        # как очередная попытка
+        _, claimed, *_ = await self.redis.xautoclaim(
+            STREAM, GROUP, consumer, int(self.claim_idle * 1000), count=count
+        )
+        for message_id, fields in claimed:
+            job = self._parse(message_id, fields)
+            if job is None:
+                await self._drop(message_id)
+                continue
+            logger.warning(f"Render job {job.key} was abandoned, retrying")
+            await self.retry(message_id, job)
+
+        response = await self.redis.xreadgroup(
+            GROUP, consumer, {STREAM: ">"}, count=count, block=block
+        )
+        jobs = []
+        for _, messages in response or []:
+            for message_id, fields in messages:
+                job = self._parse(message_id, fields)
+                if job is None:
+                    await self._drop(message_id)
+                else:
+                    jobs.append((message_id, job))
+        return jobs
+
+    def _parse(self, message_id: bytes, fields: Dict[bytes, bytes] | None):
+        try:
+            return RenderJob.model_validate_json(fields[b"job"])
+        except (TypeError, KeyError, ValidationError) as e:
+            logger.error(f"Render job {message_id} is malformed: {e}")
+            return None
+
+    async def _drop(self, message_id: bytes):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xack(STREAM, GROUP, message_id).xdel(STREAM, message_id)
+            await pipe.execute()
+
+    async def complete(self, message_id: bytes, job: RenderJob):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xack(STREAM, GROUP, message_id).xdel(STREAM, message_id)
+            await pipe.delete(f"{STREAM}:key:{job.key}").execute()
+
+    async def retry(self, message_id: bytes, job: RenderJob) -> bool:
+        # Возвращает False, если попытки закончились и задача ушла в dead-letter
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if job.attempt < self.max_attempts:
+                retried = job.model_copy(update={"attempt": job.attempt + 1})
+                pipe.xadd(STREAM, {"job": retried.model_dump_json()})
+            else:
+                pipe.xadd(DEAD_STREAM, {"job": job.model_dump_json()})
+                pipe.delete(f"{STREAM}:key:{job.key}")
+            pipe.xack(STREAM, GROUP, message_id).xdel(STREAM, message_id)
+            await pipe.execute()
+        return job.attempt < self.max_attempts
+
+    async def release(self, message_id: bytes, job: RenderJob):
+        # Задача, прерванная остановкой воркера, сразу возвращается в очередь
+        # и не тратит попытку
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xadd(STREAM, {"job": job.model_dump_json()})
+            pipe.xack(STREAM, GROUP, message_id).xdel(STREAM, message_id)
+            await pipe.execute()
+
+    async def cancel(self, user_id: int):
+        await self.redis.set(
+            f"{STREAM}:cancel:{user_id}", time.time(), ex=self.dedup_ttl
+        )
+
+    async def is_cancelled(self, job: RenderJob) -> bool:
+        cancelled = await self.redis.get(f"{STREAM}:cancel:{job.user_id}")
+        return cancelled is not None and float(cancelled) >= job.created
+
+
+@lru_cache(maxsize=None)
+def get_stream_queue() -> JobQueue | None:
+    # Поток задач нужен и без RENDER_QUEUE: в него сохраняются рендеры,
+    # не завершенные при остановке бота
+    redis = get_redis()
+    if redis is None:
+        return None
+    return JobQueue(
+        redis,
+        max_attempts=settings.job_max_attempts,
+        claim_idle=settings.job_claim_idle,
+        dedup_ttl=settings.job_dedup_ttl,
+        max_backlog=settings.render_max_backlog,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_job_queue() -> JobQueue | None:
+    if not settings.render_queue:
+        return None
+    queue = get_stream_queue()
+    if queue is None:
+        logger.warning("RENDER_QUEUE requires Redis storage, rendering inline")
+    return queue
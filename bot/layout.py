@@ -0,0 +1,136 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, List, Tuple
+
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from bot.fonts import get_font
+
+ELLIPSIS = "…"
+
+
+def fmt_number(v):
+    return f"{v:,}".replace(",", " ")
+
+
+@lru_cache(maxsize=None)
+def width_table(font_name: str) -> Tuple[Callable[[int, float], float], float]:
+    # Ширины глифов в тысячных долях кегля, как в TTFont.stringWidth
+    font = get_font(font_name)
+    if isinstance(font, TTFont):
+        return font.face.charWidths.get, font.face.defaultWidth
+    return (
+        lambda code, default: pdfmetrics.stringWidth(chr(code), font_name, 1000),
+        0.0,
+    )
+
+
+@lru_cache(maxsize=65536)
+def word_width(word: str, font_name: str) -> float:
+    get, default = width_table(font_name)
+    return sum(get(code, default) for code in map(ord, word)) / 1000
+
+
+def string_width(text: str, font_name: str, font_size: float) -> float:
+    space = word_width(" ", font_name)
+    words = text.split(" ")
+    return (
+        sum(word_width(word, font_name) for word in words) + space * (len(words) - 1)
+    ) * font_size
+
+
+def _break_word(word: str, font_name: str, max_width: float) -> List[str]:
+    # max_width - в долях кегля
+    get, default = width_table(font_name)
+    parts, start, width = [], 0, 0.0
+    for i, code in enumerate(map(ord, word)):
+        char_width = get(code, default) / 1000
+        if width + char_width > max_width and i > start:
+            parts.append(word[start:i])
+            start, width = i, 0.0
+        width += char_width
+    parts.append(word[start:])
+    return parts
+
+
+def wrap(text: str, font_name: str, font_size: float, width: float) -> List[str]:
+    max_width = width / font_size
+    space = word_width(" ", font_name)
+    lines: List[str] = []
+    line: List[str] = []
+    line_width = 0.0
+    for word in text.split():
+        w = word_width(word, font_name)
+        if line and line_width + space + w <= max_width:
+            line.append(word)
+            line_width += space + w
+            continue
+        if line:
+            lines.append(" ".join(line))
+        if w <= max_width:
+            line, line_width = [word], w
+            continue
+        *full, rest = _break_word(word, font_name, max_width)
+        lines.extend(full)
+        line, line_width = [rest], word_width(rest, font_name)
+    lines.append(" ".join(line))
+    return lines
+
+
+def ellipsize(text: str, font_name: str, font_size: float, width: float) -> str:
+    if string_width(text, font_name, font_size) <= width:
+        return text
+    max_width = width / font_size - word_width(ELLIPSIS, font_name)
+    return _break_word(text, font_name, max_width)[0].rstrip() + ELLIPSIS
+
+
+@dataclass
+class TextBlock:
+    lines: List[str]
+    font_name: str
+    font_size: float
+    leading: float
+    truncated: bool = False
+
+    @property
+    def height(self) -> float:
+        # Расстояние от базовой линии первой строки до последней
+        return (len(self.lines) - 1) * self.leading
+
+    def draw(self, c: canvas.Canvas, x: float, y: float):
+        c.setFont(self.font_name, self.font_size)
+        for i, line in enumerate(self.lines):
+            c.drawString(x, y - i * self.leading, line)
+
+
+def fit_text(
+    text: str,
+    font_name: str,
+    font_size: float,
+    width: float,
+    max_height: float | None = None,
+    min_font_size: float | None = None,
+    leading: float = 1.15,
+    step: float = 0.5,
+) -> TextBlock:
+    # Уменьшаем кегль, пока текст не поместится в max_height;
+    # на минимальном кегле лишние строки обрезаются многоточием.
+    # Без max_height блок растет по высоте - высоту строки выбирает вызывающий
+    min_font_size = min_font_size or font_size
+    size = font_size
+    while True:
+        lines = wrap(text, font_name, size, width)
+        block = TextBlock(lines, font_name, size, size * leading)
+        if max_height is None or block.height <= max_height:
+            return block
+        if size - step < min_font_size:
+            break
+        size -= step
+
+    max_lines = int(max_height // block.leading) + 1
+    rest = " ".join(lines[max_lines - 1:])
+    block.lines = lines[: max_lines - 1] + [ellipsize(rest, font_name, size, width)]
+    block.truncated = True
+    return block
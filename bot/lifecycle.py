@@ -0,0 +1,123 @@
+import asyncio
+import contextlib
+import signal
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Dict, List
+
+from aiogram import Dispatcher
+from loguru import logger
+from redis.exceptions import RedisError
+
+from bot.jobs import RenderJob, get_stream_queue
+from bot.settings import settings
+
+if TYPE_CHECKING:
+    from bot.worker.worker import RenderWorker
+
+
+def handle_signals(callback: Callable[[], None]):
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, callback)
+
+
+class Lifecycle:
+    # Остановка реплики без потери договоров: новые обновления уже не
+    # приходят, начатые рендеры и отправки дожидаются до дедлайна,
+    # а недоделанные сохраняются в поток задач для следующего экземпляра
+    def __init__(self, drain_timeout: float):
+        self.drain_timeout = drain_timeout
+        self._renders: Dict[asyncio.Task, RenderJob | None] = {}
+        self._workers: List["RenderWorker"] = []
+        self._consumers: List[asyncio.Task] = []
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._renders)
+
+    @contextlib.asynccontextmanager
+    async def render(self, job: RenderJob | None = None) -> AsyncIterator[None]:
+        # Без задачи рендер только дожидается при остановке, но не сохраняется
+        task = asyncio.current_task()
+        self._renders[task] = job
+        try:
+            yield
+        finally:
+            self._renders.pop(task, None)
+
+    def add_worker(self, worker: "RenderWorker"):
+        # Задачи воркера уже лежат в потоке, при остановке он возвращает их сам
+        self._workers.append(worker)
+
+    def run_worker(self, worker: "RenderWorker") -> asyncio.Task:
+        # Бот без отдельных воркеров читает поток все время работы: туда
+        # сохраняют недоделанные рендеры и реплики, остановленные позже него
+        self.add_worker(worker)
+        task = asyncio.create_task(worker.run())
+        task.add_done_callback(self._consumer_done)
+        self._consumers.append(task)
+        return task
+
+    def _consumer_done(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Render queue consumer failed: {task.exception()!r}")
+
+    def install(self, dispatcher: Dispatcher):
+        dispatcher.shutdown.register(self.shutdown)
+        # Диспетчер регистрирует закрытие хранилища в конструкторе, а оно
+        # нужно рендерам до конца: остановка идет первой
+        handlers = dispatcher.shutdown.handlers
+        handlers.insert(0, handlers.pop())
+
+    async def shutdown(self):
+        for worker in self._workers:
+            worker.stop()
+        unfinished, *_ = await asyncio.gather(
+            self.drain(),
+            self.stop_consumers(),
+            *(worker.drain(self.drain_timeout) for worker in self._workers),
+        )
+        await self.persist(unfinished)
+
+    async def stop_consumers(self):
+        # Остановленный воркер выходит после текущего блокирующего чтения
+        if not self._consumers:
+            return
+        _, pending = await asyncio.wait(self._consumers, timeout=self.drain_timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    async def drain(self) -> List[RenderJob]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.drain_timeout
+        # Обработчик, начатый до остановки, может успеть запустить новый рендер
+        while self._renders and loop.time() < deadline:
+            logger.info(f"Waiting for {self.in_flight} render(s) to finish")
+            await asyncio.wait(list(self._renders), timeout=deadline - loop.time())
+
+        unfinished = dict(self._renders)
+        for task in unfinished:
+            task.cancel()
+        await asyncio.gather(*unfinished, return_exceptions=True)
+        if unfinished:
+            logger.warning(f"{len(unfinished)} render(s) did not finish in time")
+        return [job for job in unfinished.values() if job is not None]
+
+    async def persist(self, jobs: List[RenderJob]):
+        if not jobs:
+            return
+        queue = get_stream_queue()
+        if queue is None:
+            logger.error(f"{len(jobs)} render(s) are lost: Redis storage is disabled")
+            return
+        try:
+            await queue.setup()
+            for job in jobs:
+                await queue.enqueue(job)
+        except RedisError as e:
+            logger.error(f"{len(jobs)} render(s) are lost: {e}")
+            return
+        logger.info(f"{len(jobs)} render(s) are saved for the next instance")
+
+
+lifecycle = Lifecycle(settings.shutdown_timeout)
@@ -0,0 +1,4 @@
+# Тексты статусов, общие для обработчиков и воркера рендера
+DONE_MESSAGE = "Готово. Для генерации нового файла нажмите /start"
+ERROR_MESSAGE = "Произошла ошибка. Попробуйте еще раз /retry.\nСбросить текущее состояние /start"
+OVERLOAD_MESSAGE = "Сервер перегружен. Попробуйте еще раз позже /retry"
@@ -0,0 +1,150 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import StateType
+from aiogram.types import TelegramObject
+from aiohttp import web
+from loguru import logger
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram
+from prometheus_client import generate_latest
+from pydantic_core import ValidationError
+
+from bot.settings import settings
+
+handler_duration = Histogram(
+    "bot_handler_duration_seconds", "Handler execution time", ["handler"]
+)
+handler_errors = Counter(
+    "bot_handler_errors_total", "Unhandled handler exceptions", ["handler"]
+)
+validation_errors = Counter(
+    "bot_validation_errors_total", "Form validation errors", ["field"]
+)
+render_duration = Histogram(
+    "bot_render_seconds",
+    "generate_pdf time including queue wait",
+    ["cache"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+render_stage_duration = Histogram(
+    "bot_render_stage_seconds",
+    "Time spent in a render stage",
+    ["stage"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+# Формы в работе считаются по всем репликам как started - finished: сессия
+# может начаться на одной реплике, а закончиться на другой или в воркере
+fsm_sessions_started = Counter(
+    "bot_fsm_sessions_started_total", "Forms started", ["state"]
+)
+fsm_sessions_finished = Counter(
+    "bot_fsm_sessions_finished_total", "Forms finished or reset"
+)
+render_backlog = Gauge(
+    "bot_render_backlog", "Render jobs waiting for a free worker on this replica"
+)
+render_rejected = Counter(
+    "bot_render_rejected_total", "Renders rejected by admission control"
+)
+pdf_size = Histogram(
+    "bot_pdf_size_bytes",
+    "Size of rendered documents",
+    buckets=(50_000, 100_000, 200_000, 400_000, 800_000, 1_600_000, 3_200_000),
+)
+pdf_saved_estimate = Gauge(
+    "bot_pdf_saved_bytes_estimate",
+    "Estimated bytes PDF output optimization saves on each document",
+    ["company"],
+)
+throttled_updates = Counter(
+    "bot_throttled_updates_total", "Updates dropped by the per-user rate limit"
+)
+telegram_retries = Counter(
+    "bot_telegram_retries_total", "Retried Bot API requests", ["reason"]
+)
+telegram_throttled = Counter(
+    "bot_telegram_throttled_seconds_total",
+    "Time Bot API requests waited for the send-rate governor",
+)
+
+
+def observe_stages(timings: Dict[str, float]):
+    for stage, seconds in timings.items():
+        render_stage_duration.labels(stage).observe(seconds)
+
+
+def observe_validation_error(e: ValidationError):
+    for error in e.errors():
+        field = str(error["loc"][0]) if error["loc"] else ""
+        validation_errors.labels(field).inc()
+
+
+class TrackedFSMContext(FSMContext):
+    # Запоминает переходы, сделанные обработчиком, чтобы не перечитывать
+    # состояние из хранилища после каждого обновления
+    def __init__(self, context: FSMContext):
+        super().__init__(context.storage, context.key)
+        self.changed = False
+        self.current: str | None = None
+
+    async def set_state(self, state: StateType = None) -> None:
+        await super().set_state(state)
+        self.record(state)
+
+    def record(self, state: StateType):
+        self.changed = True
+        self.current = state.state if isinstance(state, State) else state
+
+
+def observe_transition(before: str | None, after: str | None):
+    if before is None and after is not None:
+        fsm_sessions_started.labels(after).inc()
+    elif before is not None and after is None:
+        fsm_sessions_finished.inc()
+
+
+class MetricsMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        state: FSMContext | None = data.get("state")
+        if state is not None:
+            state = data["state"] = TrackedFSMContext(state)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except ValidationError as e:
+            observe_validation_error(e)
+            handler_errors.labels(name).inc()
+            raise
+        except Exception:
+            handler_errors.labels(name).inc()
+            raise
+        finally:
+            handler_duration.labels(name).observe(time.perf_counter() - started)
+            if state is not None and state.changed:
+                observe_transition(data.get("raw_state"), state.current)
+
+
+async def metrics(request: web.Request) -> web.Response:
+    return web.Response(
+        body=generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST}
+    )
+
+
+async def start_metrics_server() -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, settings.metrics_host, settings.metrics_port).start()
+    logger.info(f"Metrics are served on {settings.metrics_host}:{settings.metrics_port}")
+    return runner
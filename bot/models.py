@@ -1,6 +1,18 @@
 from dataclasses import dataclass
+from typing import List
 
-from pydantic import BaseModel, constr, conint
+from pydantic import BaseModel, constr, conint, model_validator
+
+
+class OrderItem(BaseModel):
+    name: constr(strip_whitespace=True)
+    quantity: conint(ge=1)
+    cost: conint(ge=0)
+    unit: constr(strip_whitespace=True) = "шт."
+
+    @property
+    def total(self) -> int:
+        return self.quantity * self.cost
 
 
 class ContractFormData(BaseModel):
@@ -13,15 +25,31 @@ class ContractFormData(BaseModel):
         strip_whitespace=True,
     )  # Example regex for phone numbers
     address: constr(strip_whitespace=True)
-    ordered_item: constr(strip_whitespace=True)
-    quantity: conint(ge=1)  # Must be at least 1
-    cost: conint(ge=0)  # Cost must be non-negative
+    # Поля одной позиции остаются для пошаговой формы и старых CSV
+    ordered_item: constr(strip_whitespace=True) | None = None
+    quantity: conint(ge=1) | None = None  # Must be at least 1
+    cost: conint(ge=0) | None = None  # Cost must be non-negative
+    items: List[OrderItem] = []
     sbp_phone: constr(
         strip_whitespace=True,
     )  # Same regex as phone
     sbp_full_name: constr(strip_whitespace=True)
     sbp_bank: constr(strip_whitespace=True)
 
+    @model_validator(mode="after")
+    def single_item(self) -> "ContractFormData":
+        if not self.items:
+            if None in (self.ordered_item, self.quantity, self.cost):
+                raise ValueError("Нужны ordered_item, quantity и cost или список items")
+            self.items = [
+                OrderItem(name=self.ordered_item, quantity=self.quantity, cost=self.cost)
+            ]
+        return self
+
+    @property
+    def total(self) -> int:
+        return sum(item.total for item in self.items)
+
 
 @dataclass
 class Company:
@@ -0,0 +1,104 @@
+import contextlib
+from functools import lru_cache
+from typing import Iterator
+from xml.sax.saxutils import escape
+
+from PIL import ImageCms
+from reportlab import rl_config
+from reportlab.pdfbase.pdfdoc import (
+    XMP,
+    PDFArray,
+    PDFCatalog,
+    PDFDictionary,
+    PDFDocument,
+    PDFName,
+    PDFStream,
+    PDFString,
+    PDFZCompress,
+)
+from reportlab.pdfgen import canvas
+
+# ASCII85 поверх Flate увеличивает каждый поток на четверть, а PDF
+# и так передается как бинарный файл. Значение читается при создании
+# изображений и при сохранении документа, поэтому задается до рендера
+rl_config.useA85 = 0
+
+XMP_PACKET = """\
+<?xpacket begin="\ufeff" id="W5M0MpCehiHzreSzNTczkc9d"?>
+<x:xmpmeta xmlns:x="adobe:ns:meta/">
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+<rdf:Description rdf:about=""
+ xmlns:dc="http://purl.org/dc/elements/1.1/"
+ xmlns:xmp="http://ns.adobe.com/xap/1.0/"
+ xmlns:pdf="http://ns.adobe.com/pdf/1.3/"
+ xmlns:pdfaid="http://www.aiim.org/pdfa/ns/id/">
+<dc:format>application/pdf</dc:format>
+<dc:title><rdf:Alt><rdf:li xml:lang="x-default">{title}</rdf:li></rdf:Alt></dc:title>
+<dc:creator><rdf:Seq><rdf:li>{author}</rdf:li></rdf:Seq></dc:creator>
+<dc:description><rdf:Alt><rdf:li xml:lang="x-default">{subject}</rdf:li></rdf:Alt></dc:description>
+<xmp:CreateDate>{date}</xmp:CreateDate>
+<xmp:ModifyDate>{date}</xmp:ModifyDate>
+<xmp:CreatorTool>{creator}</xmp:CreatorTool>
+<pdf:Producer>{producer}</pdf:Producer>
+<pdf:Keywords>{keywords}</pdf:Keywords>
+<pdfaid:part>2</pdfaid:part>
+<pdfaid:conformance>B</pdfaid:conformance>
+</rdf:Description>
+</rdf:RDF>
+</x:xmpmeta>
+<?xpacket end="w"?>"""
+
+
+@contextlib.contextmanager
+def ascii85() -> Iterator[None]:
+    # Кодирование, которое использует ReportLab по умолчанию: нужно только
+    # для сравнения размеров
+    previous = rl_config.useA85
+    rl_config.useA85 = 1
+    try:
+        yield
+    finally:
+        rl_config.useA85 = previous
+
+
+@lru_cache(maxsize=None)
+def srgb_profile() -> bytes:
+    return ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+
+
+def xmp_metadata(doc: PDFDocument) -> bytes:
+    # Значения должны совпадать со словарем Info, иначе PDF/A не пройдет проверку
+    info = doc.info
+    ts = doc._timeStamp
+    date = "%04d-%02d-%02dT%02d:%02d:%02d" % tuple(ts.YMDhms)
+    return XMP_PACKET.format(
+        title=escape(info.title),
+        author=escape(info.author),
+        subject=escape(info.subject),
+        date=f"{date}{ts.dhh:+03d}:{ts.dmm:02d}",
+        creator=escape(info.creator),
+        producer=escape(info.producer),
+        keywords=escape(info.keywords),
+    ).encode()
+
+
+def apply_pdfa(c: canvas.Canvas):
+    # Метаданные и output intent, которые PDF/A-2b требует сверх обычного
+    # документа: шрифты и так встроены, а цвета заданы в DeviceRGB
+    doc = c._doc
+    doc.Catalog.Metadata = XMP(creator=xmp_metadata)
+    profile = PDFStream(
+        PDFDictionary({"N": 3}), content=srgb_profile(), filters=[PDFZCompress]
+    )
+    intent = PDFDictionary(
+        {
+            "Type": PDFName("OutputIntent"),
+            "S": PDFName("GTS_PDFA1"),
+            "OutputConditionIdentifier": PDFString("sRGB IEC61966-2.1"),
+            "Info": PDFString("sRGB IEC61966-2.1"),
+            "DestOutputProfile": doc.Reference(profile),
+        }
+    )
+    # Каталог ReportLab выводит только известные ему ключи
+    doc.Catalog.__NoDefault__ = [*PDFCatalog.__NoDefault__, "OutputIntents"]
+    doc.Catalog.OutputIntents = PDFArray([intent])
@@ -0,0 +1,359 @@
+import hashlib
+import re
+import zlib
+from functools import lru_cache
+from io import BytesIO
+from typing import Dict, List, Tuple
+
+from reportlab.lib.rl_accel import fp_str
+from reportlab.lib.utils import TimeStamp
+from reportlab.pdfbase.pdfdoc import PDFInfo, xObjectName
+from reportlab.pdfbase.ttfonts import TTFont
+
+from bot.static_layer import (
+    CONTRACT_BODY,
+    FIRST_PAGE,
+    SECOND_PAGE,
+    TABLE_HEADER,
+    StaticLayer,
+    get_static_layer,
+    new_canvas,
+)
+
+# Те же экранирования, что у canvas._escape в ReportLab
+ESCAPES = [
+    f"\\{c:03o}" if c < 32 or c >= 127 else "\\" * (chr(c) in "\\()") + chr(c)
+    for c in range(256)
+]
+RESOURCES = (
+    "/Font %s /ProcSet [ /PDF /Text /ImageB /ImageC /ImageI ] /XObject <<\n%s\n>>"
+)
+MEDIA_BOX = "[ 0 0 %s %s ]"
+
+
+class UnsupportedText(ValueError):
+    pass
+
+
+@lru_cache(maxsize=8192)
+def fp(value: float) -> str:
+    # fp_str из ReportLab на чистом Python, а координаты повторяются
+    return fp_str(value)
+
+
+def pdf_text(value: str) -> str:
+    if value.isascii():
+        return "(%s)" % "".join(ESCAPES[ord(c)] for c in value)
+    return "<FEFF%s>" % value.encode("utf-16-be").hex().upper()
+
+
+class FontEncoding:
+    # Коды символов назначены при компиляции статического слоя:
+    # документ только ищет их и не меняет подмножества шрифта
+    def __init__(self, font: TTFont, state: TTFont.State):
+        self.font_name = font.fontName
+        self.internal_name = state.internalName
+        self.glyphs = font.face.charToGlyph
+        self.codes: Dict[str, Tuple[int, str]] = {
+            chr(cp): (n >> 8, ESCAPES[n & 0xFF]) for cp, n in state.assignments.items()
+        }
+        if " " in self.codes:
+            # Неразрывный пробел ReportLab выводит как обычный
+            self.codes["\xa0"] = self.codes[" "]
+        self.table = {ord(char): escaped for char, (_, escaped) in self.codes.items()}
+        # Серии символов одного подмножества выделяются регулярным выражением
+        # и экранируются через str.translate, без цикла по символам
+        chars: Dict[int, List[str]] = {}
+        for char, (subset, _) in self.codes.items():
+            chars.setdefault(subset, []).append(char)
+        self.group_subsets = sorted(chars)
+        groups = [f"([{re.escape(''.join(chars[n]))}]+)" for n in self.group_subsets]
+        self.pattern = re.compile("|".join([*groups, "(.)"]), re.DOTALL)
+
+    def runs(self, text: str) -> List[Tuple[int, str]]:
+        runs: List[Tuple[int, str]] = []
+        for match in self.pattern.finditer(text):
+            index = match.lastindex - 1
+            if index < len(self.group_subsets):
+                subset = self.group_subsets[index]
+                chunk = match.group().translate(self.table)
+            else:
+                char = match.group()
+                if ord(char) in self.glyphs:
+                    raise UnsupportedText(f"{self.font_name}: {char!r} is not reserved")
+                # Символа нет в шрифте - как и ReportLab, выводим .notdef
+                subset, chunk = 0, ESCAPES[0]
+            if runs and runs[-1][0] == subset:
+                runs[-1] = (subset, runs[-1][1] + chunk)
+            else:
+                runs.append((subset, chunk))
+        return runs
+
+    def format(self, text: str, size: float, leading: float, subset: int):
+        # Повторяет TextObject._formatText для TrueType-шрифтов
+        operators = []
+        for run_subset, chunk in self.runs(text):
+            if run_subset != subset:
+                operators.append(
+                    f"/{self.internal_name}+{run_subset} {fp(size)} Tf {fp(leading)} TL"
+                )
+                subset = run_subset
+            operators.append(f"({chunk}) Tj")
+        return " ".join(operators), subset
+
+
+class FastText:
+    def __init__(self, canvas: "FastCanvas", x: float, y: float):
+        self._canvas = canvas
+        self._code = ["BT", f"1 0 0 1 {fp(x)} {fp(y)} Tm"]
+        self._font = canvas._font
+        self._subset = -1
+
+    def setFont(self, font_name: str, size: float, leading: float | None = None):
+        self._font = self._canvas._writer.font_state(font_name, size, leading)
+        self._subset = -1
+
+    def textLine(self, text: str = ""):
+        if self._font is None:
+            raise UnsupportedText("Initial canvas font is not supported")
+        font, size, leading = self._font
+        operators, self._subset = font.format(text, size, leading, self._subset)
+        self._code.append(f"{operators} T*")
+
+    def textLines(self, stuff: str, trim: int = 1):
+        lines = stuff.strip().split("\n")
+        for line in lines:
+            self.textLine(line.strip() if trim == 1 else line)
+
+    def getCode(self) -> str:
+        return " ".join([*self._code, "ET"])
+
+
+class FastCanvas:
+    # Та часть API canvas.Canvas, которой рисуется договор. Операторы
+    # страниц те же, что выводит ReportLab, но сразу пишутся строками
+    def __init__(self, writer: "ContractWriter"):
+        self._writer = writer
+        self._pages: List[Tuple[List[str], List[str]]] = []
+        self._title = PDFInfo.title
+        self._author = PDFInfo.author
+        self._start_page()
+
+    def _start_page(self):
+        self._code: List[str] = []
+        self._forms: List[str] = []
+        self._font = None
+        self._stack = []
+
+    def setTitle(self, title: str):
+        self._title = title
+
+    def setAuthor(self, author: str):
+        self._author = author
+
+    def setFont(self, font_name: str, size: float, leading: float | None = None):
+        self._font = self._writer.font_state(font_name, size, leading)
+
+    def beginText(self, x: float = 0, y: float = 0) -> FastText:
+        return FastText(self, x, y)
+
+    def drawText(self, text: FastText):
+        self._code.append(text.getCode())
+
+    def drawString(self, x: float, y: float, text: str):
+        text_object = self.beginText(x, y)
+        text_object.textLine(text)
+        self.drawText(text_object)
+
+    def saveState(self):
+        self._stack.append(self._font)
+        self._code.append("q")
+
+    def restoreState(self):
+        self._code.append("Q")
+        self._font = self._stack.pop()
+
+    def translate(self, dx: float, dy: float):
+        self._code.append(f"1 0 0 1 {fp(dx)} {fp(dy)} cm")
+
+    def line(self, x1: float, y1: float, x2: float, y2: float):
+        self._code.append(f"n {fp(x1)} {fp(y1)} m {fp(x2)} {fp(y2)} l S")
+
+    def doForm(self, name: str):
+        self._code.append(f"/{xObjectName(name)} Do")
+        self._forms.append(name)
+
+    def showPage(self):
+        self._pages.append((self._code, self._forms))
+        self._start_page()
+
+    def getpdfdata(self) -> bytes:
+        return self._writer.write(self)
+
+
+class ContractWriter:
+    # Статическая часть документа (шрифты, изображения, формы) сериализуется
+    # один раз средствами ReportLab. Для каждого договора дописываются только
+    # страницы, каталог, Info и таблица xref
+    def __init__(self, layer: StaticLayer):
+        self.layer = layer
+        self.fonts = {
+            font.fontName: FontEncoding(font, state) for font, state in layer.fonts
+        }
+
+        c = new_canvas(BytesIO())
+        layer.apply(c)
+        for name in (FIRST_PAGE, TABLE_HEADER, CONTRACT_BODY, SECOND_PAGE):
+            c.doForm(name)
+        c.showPage()
+        self.preamble = c._preamble
+        self.media_box = MEDIA_BOX % (fp(c._pagesize[0]), fp(c._pagesize[1]))
+        self._compile(c.getpdfdata())
+
+    def _compile(self, template: bytes):
+        xref = int(re.search(rb"startxref\s+(\d+)", template).group(1))
+        table = re.compile(rb"xref\s+0 (\d+)\s+").match(template, xref)
+        size = int(table.group(1))
+        entries = template[table.end() :]
+        offsets = {n: int(entries[20 * n : 20 * n + 10]) for n in range(1, size)}
+        starts = sorted(offsets.values())
+        ends = dict(zip(starts, [*starts[1:], xref]))
+
+        def body(number: int) -> bytes:
+            return template[offsets[number] : ends[offsets[number]]]
+
+        def ref(key: bytes, data: bytes) -> int:
+            return int(re.search(key + rb"\s*(\d+) 0 R", data).group(1))
+
+        trailer = template[xref:]
+        root = ref(rb"/Root", trailer)
+        pages = ref(rb"/Pages", body(root))
+        page = ref(rb"/Kids \[", body(pages))
+        page_body = body(page)
+        contents = ref(rb"/Contents", page_body)
+        dynamic = {root, ref(rb"/Info", trailer), pages, page, contents}
+
+        self.font_ref = re.search(rb"/Font (\d+ 0 R)", page_body).group(1).decode()
+        self.xobjects = {
+            name.decode(): value.decode()
+            for name, value in re.findall(rb"/(FormXob\.\S+) (\d+ 0 R)", page_body)
+        }
+        self.header = template[: min(offsets.values())]
+        self.size = size
+        # Освободившиеся номера занимают объекты документа
+        self.free = sorted(dynamic)
+        self.offsets: Dict[int, int] = {}
+        chunks = []
+        position = len(self.header)
+        for number in sorted(offsets, key=offsets.get):
+            if number in dynamic:
+                continue
+            self.offsets[number] = position
+            chunks.append(body(number))
+            position += len(chunks[-1])
+        self.static = b"".join(chunks)
+
+    def font_state(self, font_name: str, size: float, leading: float | None):
+        font = self.fonts.get(font_name)
+        if font is None:
+            raise UnsupportedText(f"Font {font_name} is not in the static layer")
+        return font, size, size * 1.2 if leading is None else leading
+
+    def canvas(self) -> FastCanvas:
+        return FastCanvas(self)
+
+    def page_content(self, code: List[str]) -> bytes:
+        # Как в canvas.showPage: преамбула, операторы и пробел в конце
+        return ("\n".join([self.preamble, *code, " "]) + "\n").encode("latin-1")
+
+    def write(self, c: FastCanvas) -> bytes:
+        pages = c._pages
+        needed = 2 * len(pages) + 3
+        numbers = self.free + list(
+            range(self.size, self.size + max(0, needed - len(self.free)))
+        )
+        pages_number, catalog_number, info_number, *page_numbers = numbers
+
+        chunks = [self.header, self.static]
+        offsets = dict(self.offsets)
+        position = len(self.header) + len(self.static)
+
+        def add(number: int, data: bytes):
+            nonlocal position
+            offsets[number] = position
+            chunk = b"%d 0 obj\n%s\nendobj\n" % (number, data)
+            chunks.append(chunk)
+            position += len(chunk)
+
+        kids = []
+        for (code, forms), page_number, content_number in zip(
+            pages, page_numbers[::2], page_numbers[1::2]
+        ):
+            content = zlib.compress(self.page_content(code))
+            add(
+                content_number,
+                b"<<\n/Filter [ /FlateDecode ] /Length %d\n>>\nstream\n%s\nendstream"
+                % (len(content), content),
+            )
+            xobjects = " ".join(
+                f"/{xObjectName(name)} {self.xobjects[xObjectName(name)]}"
+                for name in sorted(set(forms))
+            )
+            resources = RESOURCES % (self.font_ref, xobjects)
+            add(
+                page_number,
+                (
+                    f"<<\n/Contents {content_number} 0 R /MediaBox {self.media_box} "
+                    f"/Parent {pages_number} 0 R /Resources <<\n{resources}\n>> "
+                    "/Rotate 0 /Type /Page\n>>"
+                ).encode(),
+            )
+            kids.append(f"{page_number} 0 R")
+
+        add(
+            pages_number,
+            b"<<\n/Count %d /Kids [ %s ] /Type /Pages\n>>"
+            % (len(kids), " ".join(kids).encode()),
+        )
+        add(
+            catalog_number,
+            b"<<\n/PageMode /UseNone /Pages %d 0 R /Type /Catalog\n>>" % pages_number,
+        )
+        ts = TimeStamp()
+        date = pdf_text(
+            "D:%04d%02d%02d%02d%02d%02d" % ts.YMDhms + "%+03d'%02d'" % (ts.dhh, ts.dmm)
+        )
+        add(
+            info_number,
+            (
+                f"<<\n/Author {pdf_text(c._author)} /CreationDate {date} "
+                f"/Creator {pdf_text(PDFInfo.creator)} /Keywords () /ModDate {date} "
+                f"/Producer {pdf_text(PDFInfo.producer)} "
+                f"/Subject {pdf_text(PDFInfo.subject)} /Title {pdf_text(c._title)} "
+                "/Trapped /False\n>>"
+            ).encode(),
+        )
+
+        digest = hashlib.md5(b"".join(chunks[2:])).hexdigest()
+        size = max(offsets) + 1
+        xref = [f"xref\n0 {size}\n0000000000 65535 f \n"]
+        xref.extend(f"{offsets[n]:010d} 00000 n \n" for n in range(1, size))
+        xref.append(
+            f"trailer\n<<\n/ID [<{digest}><{digest}>] /Info {info_number} 0 R "
+            f"/Root {catalog_number} 0 R /Size {size}\n>>\n"
+            f"startxref\n{position}\n%%EOF\n"
+        )
+        chunks.append("".join(xref).encode())
+        return b"".join(chunks)
+
+
+_writers: Dict[str, ContractWriter] = {}
+
+
+def get_writer(contract_name: str) -> ContractWriter:
+    # Как и слой, writer пересобирается вслед за шаблоном
+    layer = get_static_layer(contract_name)
+    writer = _writers.get(contract_name)
+    if writer is None or writer.layer is not layer:
+        writer = _writers[contract_name] = ContractWriter(layer)
+    return writer
@@ -0,0 +1,93 @@
+import json
+from typing import Any, Dict, List, Tuple
+
+from pydantic import ValidationError
+
+# Подписи полей: первая используется в подсказке и в сообщениях об ошибках
+FIELD_LABELS: Dict[str, List[str]] = {
+    "company_name": ["компания", "company"],
+    "date": ["дата", "дата договора"],
+    "contract_number": ["номер", "номер договора"],
+    "last_name": ["фамилия"],
+    "first_name": ["имя"],
+    "middle_name": ["отчество"],
+    "phone": ["телефон"],
+    "address": ["адрес"],
+    "ordered_item": ["товар", "item"],
+    "quantity": ["количество"],
+    "cost": ["стоимость", "цена"],
+    "sbp_phone": ["телефон сбп"],
+    "sbp_full_name": ["фио сбп"],
+    "sbp_bank": ["банк сбп", "банк"],
+}
+ITEM_LABELS = {"name": "наименование", "quantity": "количество", "cost": "стоимость"}
+
+ALIASES = {
+    alias: field
+    for field, labels in FIELD_LABELS.items()
+    for alias in [field, *labels]
+}
+
+QUICK_PROMPT = "\n".join(
+    [
+        "Отправьте все поля одним сообщением, по одному на строку:",
+        *(f"{labels[0]}: ..." for labels in FIELD_LABELS.values()),
+        "",
+        "Несколько товаров - строками «товар: наименование | количество | цена»",
+    ]
+)
+
+
+def parse_quick_message(text: str) -> Tuple[Dict[str, Any], List[str]]:
+    fields: Dict[str, Any] = {}
+    items: List[Dict[str, str]] = []
+    errors: List[str] = []
+    for n, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        key, sep, value = line.partition(":")
+        field = ALIASES.get(" ".join(key.lower().split()))
+        if not sep or field is None:
+            errors.append(f"Строка {n}: неизвестное поле «{key.strip()}»")
+            continue
+        value = value.strip()
+        if field == "ordered_item" and "|" in value:
+            parts = [part.strip() for part in value.rsplit("|", 2)]
+            if len(parts) != 3:
+                errors.append(
+                    f"Строка {n}: ожидается «товар: наименование | количество | цена»"
+                )
+                continue
+            items.append(dict(zip(("name", "quantity", "cost"), parts)))
+            continue
+        fields[field] = value
+    if items:
+        fields["items"] = items
+    return fields, errors
+
+
+def parse_web_app_data(data: str) -> Tuple[Dict[str, Any], List[str]]:
+    try:
+        fields = json.loads(data)
+    except ValueError:
+        return {}, ["Данные формы не разобраны"]
+    if not isinstance(fields, dict):
+        return {}, ["Данные формы должны быть объектом"]
+    return fields, []
+
+
+def field_label(loc: Tuple[Any, ...]) -> str:
+    if not loc:
+        return "Форма"
+    field, *rest = loc
+    if field == "items" and rest:
+        label = f"товар №{rest[0] + 1}"
+        if len(rest) > 1:
+            label += f", {ITEM_LABELS.get(rest[1], rest[1])}"
+        return label
+    labels = FIELD_LABELS.get(field)
+    return labels[0] if labels else str(field)
+
+
+def validation_errors(e: ValidationError) -> List[str]:
+    return [f"{field_label(error['loc'])}: {error['msg']}" for error in e.errors()]
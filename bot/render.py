@@ -0,0 +1,146 @@
+import tempfile
+from typing import Dict
+
+from loguru import logger
+from reportlab.lib.units import mm
+from reportlab.pdfgen import canvas
+
+from bot.document import RenderedPdf, StageTimer
+from bot.layout import TextBlock, fit_text, fmt_number
+from bot.models import ContractFormData
+from bot.output import apply_pdfa
+from bot.pdfwriter import FastCanvas, UnsupportedText, get_writer
+from bot.settings import settings
+from bot.static_layer import (
+    CONTRACT_BODY,
+    FIRST_PAGE,
+    PAGE_WIDTH,
+    SECOND_PAGE,
+    StaticLayer,
+    get_static_layer,
+    new_canvas,
+)
+from bot.table import draw_items_table
+from bot.templates import Point
+
+# Выполняется в процессах рендера: здесь не должно быть импортов aiogram и redis
+
+
+def render_pdf(data: ContractFormData, contract_name: str):
+    document_name = f'Счет-договор на поставку товара № {data.contract_number}'
+    timer = StageTimer()
+
+    # Шрифты и изображения загружаются при компиляции слоя
+    layer = get_static_layer(contract_name)
+    company_data = layer.template.contract.company
+    timer.mark("assets")
+
+    pdf = None
+    if settings.pdf_fast_writer and settings.pdf_profile == "default":
+        # Статическая часть файла уже сериализована, дописываются только страницы
+        c = get_writer(contract_name).canvas()
+        timer.mark("layer")
+        try:
+            pdf = draw_contract(c, data, layer, document_name, timer)
+        except UnsupportedText as e:
+            logger.debug(f"Rendering {document_name} with ReportLab: {e}")
+
+    if pdf is None:
+        c = new_canvas(None)
+        if settings.pdf_profile == "pdfa":
+            apply_pdfa(c)
+        # Шапка, текст договора, реквизиты поставщика и изображения
+        # уже скомпилированы в статический слой компании
+        layer.apply(c)
+        timer.mark("layer")
+        pdf = draw_contract(c, data, layer, document_name, timer)
+
+    file_name = f"{company_data.name}. {document_name}"
+    report = dict(timings=timer.timings, size=len(pdf))
+    if len(pdf) <= settings.render_spool_size:
+        return RenderedPdf(file_name, data=pdf, **report)
+
+    # Большие документы не гоняем через pickle между процессами
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp_file:
+        tmp_file.write(pdf)
+    timer.mark("spool")
+    return RenderedPdf(file_name, path=tmp_file.name, **report)
+
+
+def draw_contract(
+    c: canvas.Canvas | FastCanvas,
+    data: ContractFormData,
+    layer: StaticLayer,
+    document_name: str,
+    timer: StageTimer,
+) -> bytes:
+    layout = layer.template.layout
+    company_data = layer.template.contract.company
+    c.setTitle(document_name)
+    c.setAuthor(company_data.name)
+    c.doForm(FIRST_PAGE)
+
+    # Добавление номера договора и даты
+    c.setFont("FreeSans", 9)
+    c.drawString(*layout.date, data.date)
+    fit_text(document_name, "FreeSans", 9, 165 * mm, 0, 6).draw(c, *layout.title)
+
+    # Таблица переносится на следующие страницы с повторением шапки,
+    # текст договора и подписи сдвигаются вслед за ней
+    total_amount = data.total
+    offset = draw_items_table(c, data.items, total_amount, layout.body_bottom)
+    c.saveState()
+    c.translate(0, offset)
+    c.doForm(CONTRACT_BODY)
+
+    # Добавление данных покупателя
+    fio = f"{data.last_name} {data.first_name} {data.middle_name}"
+    buyer = buyer_blocks(data, fio, PAGE_WIDTH - 10 * mm - layout.buyer[0][0])
+    draw_buyer(c, buyer, layout.buyer[0])
+    c.restoreState()
+
+    c.showPage()
+    c.doForm(SECOND_PAGE)
+
+    text_object = c.beginText(*layout.sbp_text)
+    text_object.setFont("FreeSans", 9)
+    text_object.textLines(
+        f"""\
+        1. Откройте приложение или личный кабинет Вашего банка.
+        2. Выберите: «Платежи» → «СБП» (Система Быстрых Платежей).
+        3. Укажите корпоративный номер компании: {data.sbp_phone}
+        4. Укажите сумму перевода: {fmt_number(total_amount)} руб.
+        5. Получатель: {company_data.name}, в лице главного бухгалтера: {data.sbp_full_name}
+        6. Выберите банк: {data.sbp_bank}
+        7. Выполните перевод.
+    """
+    )
+    c.drawText(text_object)
+
+    draw_buyer(c, buyer, layout.buyer[1])
+
+    c.showPage()
+    timer.mark("drawing")
+    pdf = c.getpdfdata()
+    timer.mark("save")
+    return pdf
+
+
+def buyer_blocks(
+    data: ContractFormData, fio: str, width: float
+) -> Dict[str, TextBlock]:
+    return {
+        "fio": fit_text(fio, "FreeSans", 9, width, 0, 6),
+        # Адрес должен закончиться выше строки с телефоном
+        "address": fit_text(f"Адрес: {data.address}", "FreeSans", 9, width, 7 * mm, 6),
+        "phone": fit_text(f"Телефон: {data.phone}", "FreeSans", 9, width, 0, 6),
+        "signature": fit_text(f"/{fio}/", "FreeSans", 9, width, 0, 6),
+    }
+
+
+def draw_buyer(c: canvas.Canvas | FastCanvas, buyer: Dict[str, TextBlock], origin: Point):
+    x, y = origin
+    buyer["fio"].draw(c, x, y)
+    buyer["address"].draw(c, x, y - 5 * mm)
+    buyer["phone"].draw(c, x, y - 15 * mm)
+    buyer["signature"].draw(c, x, y - 25 * mm)
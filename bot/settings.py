@@ -1,14 +1,16 @@
 import logging
+import os
 import pathlib
-from typing import Dict
+import tempfile
+from functools import lru_cache
+from typing import TYPE_CHECKING, Literal
 
-from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.fsm.storage.redis import RedisStorage
-from aiogram.types import BotCommand
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
-from bot.models import Contract, Company
+if TYPE_CHECKING:
+    from aiogram import Bot, Dispatcher
+    from aiogram.fsm.storage.base import BaseStorage
+    from redis.asyncio import Redis
 
 
 class Settings(BaseSettings):
@@ -16,8 +18,61 @@ class Settings(BaseSettings):
     use_redis: bool = True
     redis_host: str = "localhost"
     redis_port: int = 6379
+    redis_max_connections: int = 32
+    fsm_ttl: int | None = 24 * 60 * 60
     log_level: str = "INFO"
     test_user_id: int | None = None
+    render_workers: int = os.cpu_count() or 1
+    render_queue_size: int = 32
+    render_timeout: float = 60
+    render_max_backlog: int = 64
+    render_spool_size: int = 4 * 1024 * 1024
+    render_cache_backend: Literal["memory", "disk", "redis", "none"] = "memory"
+    render_cache_size: int = 64 * 1024 * 1024
+    render_cache_ttl: int = 24 * 60 * 60
+    render_cache_dir: pathlib.Path = pathlib.Path(tempfile.gettempdir()).joinpath(
+        "pdf_contract_bot"
+    )
+    file_id_ttl: int = 30 * 24 * 60 * 60
+    batch_max_rows: int = 1000
+    batch_volume_size: int = 45 * 1024 * 1024
+    run_mode: Literal["polling", "webhook"] = "polling"
+    webhook_url: str | None = None
+    webhook_path: str = "/webhook"
+    webhook_secret: str | None = None
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8080
+    metrics_host: str = "0.0.0.0"
+    metrics_port: int | None = 9100
+    template_check_interval: float = 1.0
+    error_message_ttl: float = 3
+    cleanup_max_pending: int = 10_000
+    rate_limit: float = 1.0
+    rate_limit_burst: int = 10
+    render_queue: bool = False
+    job_max_attempts: int = 3
+    job_claim_idle: float = 120
+    job_dedup_ttl: int = 60 * 60
+    # Сколько остановка ждет начатые рендеры и отправки, остальные
+    # сохраняются в очередь задач для следующего экземпляра
+    shutdown_timeout: float = 20
+    # Bot API: адрес сервера (например, локального), пул соединений и лимиты
+    # отправки на реплику. Telegram допускает около 30 сообщений в секунду
+    # всего и около одного в секунду в чат
+    telegram_api_url: str | None = None
+    telegram_connections: int = 100
+    telegram_keepalive: float = 60
+    telegram_send_rate: float = 25
+    telegram_send_burst: int = 25
+    telegram_chat_rate: float = 1
+    telegram_chat_burst: int = 3
+    telegram_max_retries: int = 3
+    telegram_retry_backoff: float = 0.5
+    telegram_retry_max_backoff: float = 10
+    # Разрешение, до которого уменьшаются изображения договора; None - исходное
+    pdf_image_dpi: int | None = 200
+    pdf_profile: Literal["default", "pdfa"] = "default"
+    pdf_fast_writer: bool = True
 
     model_config = SettingsConfigDict(
         env_file=pathlib.Path(__file__).parent.parent.joinpath(".env"),
@@ -30,6 +85,8 @@ class Settings(BaseSettings):
 
     @property
     def bot_commands(self):
+        from aiogram.types import BotCommand
+
         return [
             BotCommand(command="/start", description="Меню. Сбросить состояние"),
             # BotCommand(command="/company_prostor", description="ООО 'Простор'"),
@@ -39,82 +96,51 @@ class Settings(BaseSettings):
             BotCommand(
                 command="/retry", description="Еще раз"
             ),
+            BotCommand(
+                command="/quick", description="Все поля одним сообщением"
+            ),
+            BotCommand(
+                command="/batch", description="Пакетная генерация из CSV/JSON"
+            ),
         ]
 
 
 settings = Settings()
 
-bot = Bot(token=settings.bot_token)
-storage = (
-    RedisStorage.from_url(url=f"redis://{settings.redis_host}:{settings.redis_port}")
-    if settings.use_redis
-    else MemoryStorage()
-)
-dp = Dispatcher(storage=storage)
-
-company_contract: Dict[str, Contract] = {
-    "prostor": Contract(
-        text="""\
-    1. Предметом настоящего Счет-договора является поставка Товара с вышеуказанным перечнем.
-    2. Поставщик обязан передать Товар Покупателю в срок от 15 до 25 календарных дней с момента зачисления оплаты.
-    3. Оплаченный Товар доставляется Покупателю силами Поставщика с использованием услуг транспортных
-    компаний и обязательным страхованием на полную сумму заказа.
-    4. Поставщик гарантирует доставку Товара Покупателю по ценам и в сроки, указанные в настоящем Счет-договоре.
-    5. Поставщик гарантирует, что данный Товар новый, в заводской упаковке, надлежащего качества,
-    соответствует своим техническим характеристикам, назначению и всем требованиям ГОСТа.
-    6. В случае просрочки поставки Товара Поставщиком в срок, указанный в Счет-договоре, Поставщик
-    уплачивает Покупателю неустойку в размере 0,5% от цены не поставленного Товара за каждый день просрочки
-    поставки до фактического исполнения обязательства по настоящему Счет-договору.
-    7. При приемке Товара Покупатель проверяет комплектность, отсутствие видимых дефектов и механических
-    повреждений. В случае обнаружения дефектов и/или некомплектности Товара, Покупатель составляет Акт
-    совместно с представителем транспортной компании, где указывает соответствующие недостатки. Поставщик
-    обязуется заменить Товар или вернуть денежные средства в полном объеме в течении 3 (трех) рабочих дней.
-    8. Претензии по качеству товара принимаются в течении 30 дней с момента принятия товара Покупателем.
-    9. Гарантийный срок (установленный заводом-изготовителем) исчисляется с момента передачи товара
-    Покупателю.
-    10. Поставка осуществляется на условиях 100% (полной) предоплаты товара по настоящему Счет-договору.
-    11. Настоящий Счет-договор действителен в течении 1 (одного) дня от даты его составления. При отсутствии
-    оплаты в указанный срок настоящий Счет-договор признается недействительным.
-    """,
-        contract_executor_fio="Любовский Алексей Михайлович",
-        company=Company(
-            name='ООО "Простор"',
-            ogrn="1197746047938",
-            inn="7728458381",
-            central_warehouse="141895, Московская область\nГлазово деревня, 30, «PNK Парк Северное Шереметьево»",
-            legal_address="117279, город Москва, Профсоюзная ул., д. 97",
-        ),
-    ),
-    "stroytorgcomplect": Contract(
-        text="""\
-    1. Предметом настоящего Счет-договора является поставка Товара с вышеуказанным перечнем.
-    2. Поставщик обязан передать Товар Покупателю в срок от 15 до 25 рабочих дней с момента зачисления оплаты.
-    3. Оплаченный Товар доставляется Покупателю силами Поставщика с использованием услуг транспортных
-    компаний и обязательным страхованием на полную сумму заказа.
-    4. Поставщик гарантирует доставку Товара Покупателю по ценам и в сроки, указанные в настоящем Счет-договоре.
-    5. Поставщик гарантирует, что данный Товар новый, в заводской упаковке, надлежащего качества,
-    соответствует своим техническим характеристикам, назначению и всем требованиям ГОСТа.
-    6. В случае просрочки поставки Товара Поставщиком в срок, указанный в Счет-договоре, Поставщик
-    уплачивает Покупателю неустойку в размере 0,5% от цены не поставленного Товара за каждый день просрочки
-    поставки до фактического исполнения обязательства по настоящему Счет-договору.
-    7. При приемке Товара Покупатель проверяет комплектность, отсутствие видимых дефектов и механических
-    повреждений. В случае обнаружения дефектов и/или некомплектности Товара, Покупатель составляет Акт
-    совместно с представителем транспортной компании, где указывает соответствующие недостатки. Поставщик
-    обязуется заменить Товар или вернуть денежные средства в полном объеме в течении 3 (трех) рабочих дней.
-    8. Претензии по качеству товара принимаются в течении 30 дней с момента принятия товара Покупателем.
-    9. Гарантийный срок (установленный заводом-изготовителем) исчисляется с момента передачи товара
-    Покупателю.
-    10. Поставка осуществляется на условиях 100% (полной) предоплаты товара по настоящему Счет-договору.
-    11. Настоящий Счет-договор действителен в течении 1 (одного) дня от даты его составления. При отсутствии
-    оплаты в указанный срок настоящий Счет-договор признается недействительным.
-    """,
-        contract_executor_fio="Шишкин Александр Сергеевич",
-        company=Company(
-            name='ООО "Стройторгкомплект" ',
-            ogrn="1157746053046",
-            inn="7728188093",
-            central_warehouse="108811, г. Москва, Киевское ш., д. 4, БП “Румянцево”",
-            legal_address="108817, г. Москва, п. Внуковское, ул. Лётчика Ульянина, д. 6",
-        ),
-    ),
-}
+
+# Бот, хранилище и диспетчер создаются при первом обращении: импорт настроек
+# не должен тянуть aiogram и redis в процессы рендера
+@lru_cache(maxsize=None)
+def get_bot() -> "Bot":
+    from aiogram import Bot
+
+    from bot.delivery import create_session
+
+    return Bot(token=settings.bot_token, session=create_session())
+
+
+@lru_cache(maxsize=None)
+def get_storage() -> "BaseStorage":
+    if not settings.use_redis:
+        from aiogram.fsm.storage.memory import MemoryStorage
+
+        return MemoryStorage()
+
+    from bot.storage import FormStorage
+
+    return FormStorage.from_url(
+        url=f"redis://{settings.redis_host}:{settings.redis_port}",
+        max_connections=settings.redis_max_connections,
+        ttl=settings.fsm_ttl,
+    )
+
+
+def get_redis() -> "Redis | None":
+    return getattr(get_storage(), "redis", None)
+
+
+@lru_cache(maxsize=None)
+def get_dispatcher() -> "Dispatcher":
+    from aiogram import Dispatcher
+
+    return Dispatcher(storage=get_storage())
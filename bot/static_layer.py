@@ -0,0 +1,292 @@
+import copy
+import math
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Dict, List, Tuple
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch, mm
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase import pdfdoc
+from reportlab.pdfbase.pdfdoc import PDFFormXObject, PDFImageXObject, PDFObject
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from bot.assets import CompanyAssets, PixelSize, get_company_assets, open_image
+from bot.fonts import DYNAMIC_CHARSET, DYNAMIC_FONTS, get_font, register_fonts
+from bot.models import Contract
+from bot.output import ascii85
+from bot.settings import settings
+from bot.templates import ContractTemplate, ImagePlacement, company_names, get_template
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+TABLE_START_Y = PAGE_HEIGHT - 72 * mm
+ROW_HEIGHT = 10 * mm
+CELL_PADDING = 2 * mm
+ITEM_X = 20 * mm + CELL_PADDING
+ITEM_WIDTH = 70 * mm - 2 * CELL_PADDING
+TABLE_COLUMNS = tuple(x * mm for x in (10, 20, 90, 110, 130, 160, 200))
+# Текст договора и подписи рисуются под таблицей: в исходной разметке
+# таблица из одной позиции и двух строк итогов заканчивалась здесь
+BODY_TOP = TABLE_START_Y - 3 * ROW_HEIGHT
+
+FIRST_PAGE = "static_page1"
+SECOND_PAGE = "static_page2"
+TABLE_HEADER = "static_table_header"
+CONTRACT_BODY = "static_contract_body"
+
+
+def new_canvas(filename) -> canvas.Canvas:
+    return canvas.Canvas(filename=filename, pagesize=A4, pageCompression=1)
+
+
+def supplier_footer(contract: Contract) -> str:
+    company_data = contract.company
+    return f"""\
+    ОГРН: {company_data.ogrn}
+    ИНН: {company_data.inn}
+    Юр. адрес: {company_data.legal_address}
+    Офис + склад: {company_data.central_warehouse}
+
+
+    __________________________/{contract.contract_executor_fio}/
+        """
+
+
+def draw_images(
+    c: canvas.Canvas, placements: Tuple[ImagePlacement, ...], assets: CompanyAssets
+):
+    for p in placements:
+        c.drawImage(
+            assets[p.image], p.x, p.y, width=p.width, height=p.height, mask="auto"
+        )
+
+
+def draw_buyer_labels(c: canvas.Canvas, origin: Tuple[float, float]):
+    # Подписи вокруг данных покупателя, origin - его первая строка
+    x, y = origin
+    c.drawString(x, y + 5 * mm, "Покупатель:")
+    c.drawString(x, y - 20 * mm, "_____________________________")
+
+
+def draw_first_page(
+    c: canvas.Canvas, template: ContractTemplate, assets: CompanyAssets
+):
+    contract = template.contract
+    company_data = contract.company
+    height = PAGE_HEIGHT
+
+    # Данные компании
+    c.setFont("FreeSansBold", 11)
+    c.drawString(10 * mm, height - 20 * mm, company_data.name)
+    c.setFont("FreeSans", 9)
+    c.drawString(10 * mm, height - 25 * mm, f"ОГРН: {company_data.ogrn}")
+    c.drawString(10 * mm, height - 30 * mm, f"ИНН: {company_data.inn}")
+    c.drawString(
+        10 * mm,
+        height - 35 * mm,
+        f"Адрес: {company_data.central_warehouse}",
+    )
+    c.drawString(10 * mm, height - 60 * mm, "г. Москва")
+
+    draw_images(c, template.layout.images.get("first", ()), assets)
+
+
+def draw_table_header(
+    c: canvas.Canvas, template: ContractTemplate, assets: CompanyAssets
+):
+    # Повторяется на каждой странице таблицы со сдвигом по вертикали
+    c.setFont("FreeSans", 9)
+    header_y = TABLE_START_Y + 2 * mm
+    c.drawString(10 * mm, header_y, "№")
+    c.drawString(20 * mm, header_y, "Наименование товара")
+    c.drawString(90 * mm, header_y, "Единица")
+    c.drawString(110 * mm, header_y, "Количество")
+    c.drawString(130 * mm, header_y, "Цена в рублях")
+    c.drawString(160 * mm, header_y, "Сумма в рублях")
+    c.line(TABLE_COLUMNS[0], TABLE_START_Y, TABLE_COLUMNS[-1], TABLE_START_Y)
+
+
+def draw_contract_body(
+    c: canvas.Canvas, template: ContractTemplate, assets: CompanyAssets
+):
+    contract = template.contract
+    # Рисуется в координатах исходной разметки, таблица сдвигает его вниз
+    company_data = contract.company
+    height = PAGE_HEIGHT
+
+    # Покупатель
+    c.setFont("FreeSans", 9)
+    draw_buyer_labels(c, template.layout.buyer[0])
+
+    # Текст договора
+    text_object = c.beginText(10 * mm, height - 110 * mm)
+    text_object.setFont("FreeSans", 9)
+    text_object.textLines(contract.text)
+    c.drawText(text_object)
+
+    # Поставщик
+    c.drawString(10 * mm, 105 * mm, "Поставщик:")
+    c.drawString(10 * mm, 100 * mm, company_data.name)
+    footer_text_object = c.beginText(10 * mm, 95 * mm)
+    footer_text_object.setFont("FreeSans", 9)
+    footer_text_object.textLines(supplier_footer(contract))
+    c.drawText(footer_text_object)
+
+    draw_images(c, template.layout.images.get("body", ()), assets)
+
+
+def draw_second_page(
+    c: canvas.Canvas, template: ContractTemplate, assets: CompanyAssets
+):
+    contract = template.contract
+    company_data = contract.company
+    height = PAGE_HEIGHT
+
+    c.setFont("FreeSansBold", 11)
+    c.drawString(10 * mm, height - 20 * mm, company_data.name)
+    c.setFont("FreeSans", 9)
+    c.drawString(10 * mm, height - 25 * mm, f"ОГРН: {company_data.ogrn}")
+    c.drawString(10 * mm, height - 30 * mm, f"ИНН: {company_data.inn}")
+    c.drawString(
+        10 * mm,
+        height - 35 * mm,
+        f"Юр. адрес: {company_data.central_warehouse}",
+    )
+
+    c.setFont("FreeSans", 11)
+    c.drawString(
+        10 * mm,
+        height - 55 * mm,
+        "Реквизиты для оплаты через СБП (Система Быстрых Платежей - сервис Банка России):",
+    )
+
+    c.setFont("FreeSans", 9)
+    c.drawString(10 * mm, 185 * mm, "Поставщик:")
+    c.drawString(10 * mm, 180 * mm, company_data.name)
+    footer_text_object = c.beginText(10 * mm, 175 * mm)
+    footer_text_object.setFont("FreeSans", 9)
+    footer_text_object.textLines(supplier_footer(contract))
+    c.drawText(footer_text_object)
+
+    draw_buyer_labels(c, template.layout.buyer[1])
+
+    draw_images(c, template.layout.images.get("second", ()), assets)
+
+
+def _clone(obj: PDFObject) -> PDFObject:
+    # Объект можно зарегистрировать только в одном документе
+    clone = copy.copy(obj)
+    clone.__dict__.pop(pdfdoc.__InternalName__, None)
+    return clone
+
+
+@dataclass
+class StaticLayer:
+    template: ContractTemplate
+    assets: CompanyAssets
+    xobjects: List[Tuple[str, PDFObject]] = field(default_factory=list)
+    fonts: List[Tuple[TTFont, TTFont.State]] = field(default_factory=list)
+
+    def apply(self, c: canvas.Canvas):
+        doc = c._doc
+        # Статический текст уже закодирован в подмножествах шрифтов,
+        # поэтому документ продолжает их, а не начинает с нуля
+        for font, state in self.fonts:
+            font.state[doc] = copy.deepcopy(state)
+            doc.fontMapping[font.fontName] = "/" + state.internalName
+            doc.delayedFonts.append(font)
+        for reg_name, obj in self.xobjects:
+            doc.Reference(_clone(obj), reg_name)
+
+
+def image_pixels(template: ContractTemplate, dpi: int) -> Dict[str, PixelSize]:
+    return {
+        name: (math.ceil(width / inch * dpi), math.ceil(height / inch * dpi))
+        for name, (width, height) in template.layout.image_sizes().items()
+    }
+
+
+def draw_forms(c: canvas.Canvas, template: ContractTemplate, assets: CompanyAssets):
+    forms = (
+        (FIRST_PAGE, draw_first_page),
+        (TABLE_HEADER, draw_table_header),
+        (CONTRACT_BODY, draw_contract_body),
+        (SECOND_PAGE, draw_second_page),
+    )
+    for name, draw in forms:
+        c.beginForm(name)
+        draw(c, template, assets)
+        c.endForm()
+    for font_name in DYNAMIC_FONTS:
+        font = get_font(font_name)
+        font.splitString(DYNAMIC_CHARSET, c._doc)
+        font.getSubsetInternalName(0, c._doc)
+
+
+def layer_size(template: ContractTemplate, assets: CompanyAssets) -> int:
+    # Размер документа из одних статических форм: динамический текст
+    # одинаков при любых настройках вывода и в сравнении не участвует
+    c = new_canvas(BytesIO())
+    draw_forms(c, template, assets)
+    for forms in ((FIRST_PAGE, TABLE_HEADER, CONTRACT_BODY), (SECOND_PAGE,)):
+        for name in forms:
+            c.doForm(name)
+        c.showPage()
+    return len(c.getpdfdata())
+
+
+def unoptimized_layer_size(template: ContractTemplate) -> int:
+    # Исходные изображения не кэшируются: они нужны только для сравнения
+    assets = {
+        name: ImageReader(open_image(path, transparent_black))
+        for name, (path, transparent_black) in template.images.items()
+    }
+    with ascii85():
+        return layer_size(template, assets)
+
+
+def compile_static_layer(template: ContractTemplate) -> StaticLayer:
+    register_fonts()
+    sizes = (
+        image_pixels(template, settings.pdf_image_dpi)
+        if settings.pdf_image_dpi
+        else None
+    )
+    layer = StaticLayer(template, assets=get_company_assets(template.images, sizes))
+
+    c = new_canvas(BytesIO())
+    draw_forms(c, template, layer.assets)
+    doc = c._doc
+    for reg_name, obj in doc.idToObject.items():
+        if isinstance(obj, (PDFImageXObject, PDFFormXObject)):
+            layer.xobjects.append((reg_name, _clone(obj)))
+    for font in doc.delayedFonts:
+        layer.fonts.append((font, copy.deepcopy(font.state[doc])))
+    return layer
+
+
+_layers: Dict[str, StaticLayer] = {}
+
+
+def get_static_layer(contract_name: str) -> StaticLayer:
+    # Шаблон перечитывается при изменении его файлов, слой - вслед за ним
+    template = get_template(contract_name)
+    layer = _layers.get(contract_name)
+    if layer is None or layer.template is not template:
+        layer = _layers[contract_name] = compile_static_layer(template)
+    return layer
+
+
+def estimate_saved_bytes(contract_name: str) -> int:
+    # Слой без оптимизаций рендерится почти секунду, поэтому оценка считается
+    # по запросу, а не при каждой компиляции слоя в процессах рендера
+    layer = get_static_layer(contract_name)
+    return unoptimized_layer_size(layer.template) - layer_size(
+        layer.template, layer.assets
+    )
+
+
+def compile_static_layers():
+    for contract_name in company_names():
+        get_static_layer(contract_name)
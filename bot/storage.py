@@ -0,0 +1,108 @@
+import json
+from typing import Any, Dict, Mapping
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.asyncio.client import Pipeline
+
+from bot.metrics import TrackedFSMContext
+
+
+def dumps(value: Any) -> str:
+    # Без \u-экранирования кириллица занимает 2 байта вместо 6
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class FormStorage(RedisStorage):
+    # Данные формы лежат в hash, по полю на ключ: update_data дописывает
+    # поля без чтения, а данные и состояние шага формы пишутся одним запросом.
+    # Каждая запись продлевает TTL, так что брошенные формы удаляются сами
+    def __init__(
+        self,
+        redis: Redis,
+        ttl: int | None = None,
+        key_builder: KeyBuilder | None = None,
+    ):
+        super().__init__(redis, key_builder=key_builder, state_ttl=ttl, data_ttl=ttl)
+
+    @classmethod
+    def from_url(
+        cls, url: str, max_connections: int = 32, ttl: int | None = None, **kwargs: Any
+    ) -> "FormStorage":
+        # Блокирующий пул ждет свободное соединение вместо ошибки при всплеске
+        pool = BlockingConnectionPool.from_url(url, max_connections=max_connections)
+        return cls(Redis(connection_pool=pool), ttl=ttl, **kwargs)
+
+    def _keys(self, key: StorageKey):
+        return self.key_builder.build(key, "state"), self.key_builder.build(key, "form")
+
+    def _set_state(self, pipe: Pipeline, state_key: str, state: StateType):
+        if state is None:
+            pipe.delete(state_key)
+        else:
+            state = state.state if isinstance(state, State) else state
+            pipe.set(state_key, state, ex=self.state_ttl)
+
+    def _set_fields(self, pipe: Pipeline, data_key: str, data: Mapping[str, Any]):
+        if data:
+            pipe.hset(data_key, mapping={k: dumps(v) for k, v in data.items()})
+
+    def _touch(self, pipe: Pipeline, *keys: str):
+        if self.data_ttl is not None:
+            for key in keys:
+                pipe.expire(key, self.data_ttl)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state_key, data_key = self._keys(key)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            self._set_state(pipe, state_key, state)
+            self._touch(pipe, data_key)
+            await pipe.execute()
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        state_key, data_key = self._keys(key)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(data_key)
+            self._set_fields(pipe, data_key, data)
+            self._touch(pipe, data_key, state_key)
+            await pipe.execute()
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        data = await self.redis.hgetall(self._keys(key)[1])
+        return {k.decode(): json.loads(v) for k, v in data.items()}
+
+    async def update_data(
+        self, key: StorageKey, data: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        state_key, data_key = self._keys(key)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            self._set_fields(pipe, data_key, data)
+            self._touch(pipe, data_key, state_key)
+            pipe.hgetall(data_key)
+            *_, merged = await pipe.execute()
+        return {k.decode(): json.loads(v) for k, v in merged.items()}
+
+    async def update_step(
+        self, key: StorageKey, state: StateType, data: Mapping[str, Any]
+    ) -> None:
+        state_key, data_key = self._keys(key)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            self._set_fields(pipe, data_key, data)
+            self._set_state(pipe, state_key, state)
+            self._touch(pipe, data_key)
+            await pipe.execute()
+
+
+async def next_step(state: FSMContext, next_state: StateType, **data: Any):
+    # Поля шага и следующее состояние пишутся одним запросом к Redis
+    if isinstance(state.storage, FormStorage):
+        await state.storage.update_step(state.key, next_state, data)
+        if isinstance(state, TrackedFSMContext):
+            state.record(next_state)
+        return
+    if data:
+        await state.update_data(data)
+    await state.set_state(next_state)
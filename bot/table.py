@@ -0,0 +1,122 @@
+from typing import Iterable
+
+from reportlab.lib.units import mm
+from reportlab.pdfgen import canvas
+
+from bot.layout import TextBlock, fit_text, fmt_number
+from bot.models import OrderItem
+from bot.static_layer import (
+    BODY_TOP,
+    CELL_PADDING,
+    ITEM_WIDTH,
+    ITEM_X,
+    PAGE_HEIGHT,
+    ROW_HEIGHT,
+    TABLE_COLUMNS,
+    TABLE_HEADER,
+    TABLE_START_Y,
+)
+
+# Верх таблицы на страницах продолжения и нижнее поле страницы
+CONTINUATION_TOP = PAGE_HEIGHT - 20 * mm
+PAGE_BOTTOM = 10 * mm
+MAX_ITEM_HEIGHT = 60 * mm
+
+
+def item_block(name: str) -> TextBlock:
+    # Сначала пробуем уместить наименование в обычную строку,
+    # иначе строка растет по высоте
+    block = fit_text(
+        name, "FreeSans", 8, ITEM_WIDTH, ROW_HEIGHT - 2 * CELL_PADDING - 8, 7
+    )
+    if block.truncated:
+        block = fit_text(name, "FreeSans", 8, ITEM_WIDTH, MAX_ITEM_HEIGHT, 6)
+    return block
+
+
+def number_block(value: int, column: int) -> TextBlock:
+    width = TABLE_COLUMNS[column + 1] - TABLE_COLUMNS[column] - 2 * CELL_PADDING
+    return fit_text(fmt_number(value), "FreeSans", 8, width, 0, 6)
+
+
+class InvoiceTable:
+    # Строки рисуются по одной, поэтому память не зависит от числа позиций
+    def __init__(self, c: canvas.Canvas, body_bottom: float):
+        self.c = c
+        self.body_bottom = body_bottom
+        self.top = self.y = TABLE_START_Y
+        self.pages = 1
+        self._header()
+
+    def _header(self):
+        self.c.saveState()
+        self.c.translate(0, self.top - TABLE_START_Y)
+        self.c.doForm(TABLE_HEADER)
+        self.c.restoreState()
+
+    def _close_segment(self):
+        for x in TABLE_COLUMNS:
+            self.c.line(x, self.top, x, self.y)
+
+    def _ensure(self, height: float):
+        if self.y - height < PAGE_BOTTOM and self.y < self.top:
+            self._close_segment()
+            self.c.showPage()
+            self.pages += 1
+            self.top = self.y = CONTINUATION_TOP
+            self._header()
+
+    def _reserve(self, height: float) -> float:
+        self._ensure(height)
+        self.y -= height
+        self.c.line(TABLE_COLUMNS[0], self.y, TABLE_COLUMNS[-1], self.y)
+        return self.y
+
+    def _cell(self, column: int, bottom: float, block: TextBlock):
+        block.draw(self.c, TABLE_COLUMNS[column] + CELL_PADDING, bottom + 2 * mm)
+
+    def add_item(self, number: int, item: OrderItem):
+        name = item_block(item.name)
+        height = max(ROW_HEIGHT, name.height + name.font_size + 2 * CELL_PADDING)
+        bottom = self._reserve(height)
+        name.draw(
+            self.c,
+            ITEM_X,
+            bottom + height / 2 + name.height / 2 - 0.35 * name.font_size,
+        )
+        self.c.setFont("FreeSans", 8)
+        self.c.drawString(TABLE_COLUMNS[0] + CELL_PADDING, bottom + 2 * mm, str(number))
+        self.c.drawString(TABLE_COLUMNS[2] + CELL_PADDING, bottom + 2 * mm, item.unit)
+        self._cell(3, bottom, number_block(item.quantity, 3))
+        self._cell(4, bottom, number_block(item.cost, 4))
+        self._cell(5, bottom, number_block(item.total, 5))
+
+    def add_totals(self, total: int):
+        # Строки итогов не разрываются между страницами
+        self._ensure(2 * ROW_HEIGHT)
+        amount = number_block(total, 5)
+        for label in ("Сумма", "Всего к оплате"):
+            bottom = self._reserve(ROW_HEIGHT)
+            self.c.setFont("FreeSans", 8)
+            self.c.drawString(TABLE_COLUMNS[4] + CELL_PADDING, bottom + 5 * mm, label)
+            amount.draw(self.c, TABLE_COLUMNS[5] + CELL_PADDING, bottom + 5 * mm)
+
+    def close(self) -> float:
+        # Возвращает сдвиг текста договора относительно исходной разметки
+        self._close_segment()
+        offset = self.y - BODY_TOP
+        if self.body_bottom + offset < PAGE_BOTTOM:
+            self.c.showPage()
+            self.pages += 1
+            offset = CONTINUATION_TOP - BODY_TOP
+        return offset
+
+
+def draw_items_table(
+    c: canvas.Canvas, items: Iterable[OrderItem], total: int, body_bottom: float
+) -> float:
+    table = InvoiceTable(c, body_bottom)
+    for number, item in enumerate(items, start=1):
+        table.add_item(number, item)
+    table.add_totals(total)
+    return table.close()
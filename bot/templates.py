@@ -0,0 +1,209 @@
+import hashlib
+import json
+import pathlib
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Literal, Tuple
+
+from loguru import logger
+from pydantic import BaseModel
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+
+from bot.models import Company, Contract
+from bot.settings import settings
+
+# Увеличивать при любом изменении разметки: версия входит в ключ кэша рендера
+LAYOUT_VERSION = 5
+
+contracts_path = pathlib.Path(__file__).parent.joinpath("contracts")
+
+TEMPLATE_FILE = "contract.json"
+LAYOUT_FILE = "layout.json"
+
+Point = Tuple[float, float]
+
+
+class ImageConfig(BaseModel):
+    file: str
+    transparent_black: bool = False
+
+
+class LayoutConfig(BaseModel):
+    # Координаты в миллиметрах от левого верхнего угла страницы
+    date: Point
+    title: Point
+    buyer: Tuple[Point, Point]
+    sbp_text: Point
+    images: Dict[
+        Literal["first", "body", "second"],
+        List[Tuple[str, float, float, float, float]],
+    ]
+
+
+class TemplateConfig(BaseModel):
+    company: Company
+    contract_executor_fio: str
+    text: str
+    images: Dict[str, ImageConfig]
+    # Переопределяет ключи общего layout.json
+    layout: Dict[str, Any] = {}
+
+
+@dataclass(frozen=True)
+class ImagePlacement:
+    image: str
+    x: float
+    y: float
+    width: float
+    height: float
+
+
+@dataclass(frozen=True)
+class Layout:
+    # Координаты в пунктах от левого нижнего угла, как у canvas
+    date: Point
+    title: Point
+    buyer: Tuple[Point, Point]
+    sbp_text: Point
+    images: Dict[str, Tuple[ImagePlacement, ...]]
+
+    @property
+    def body_bottom(self) -> float:
+        return min((p.y for p in self.images.get("body", ())), default=0.0)
+
+    def image_sizes(self) -> Dict[str, Tuple[float, float]]:
+        # Наибольший размер, с которым изображение рисуется на страницах
+        sizes: Dict[str, Tuple[float, float]] = {}
+        for placements in self.images.values():
+            for p in placements:
+                width, height = sizes.get(p.image, (0.0, 0.0))
+                sizes[p.image] = (max(width, p.width), max(height, p.height))
+        return sizes
+
+
+@dataclass
+class ContractTemplate:
+    digest: str
+    contract: Contract
+    layout: Layout
+    images: Dict[str, Tuple[pathlib.Path, bool]]
+
+
+@dataclass
+class _Loaded:
+    template: ContractTemplate
+    files: List[pathlib.Path]
+    mtimes: List[int]
+    checked: float = field(default_factory=time.monotonic)
+
+
+def _point(value: Point) -> Point:
+    x, top = value
+    return x * mm, A4[1] - top * mm
+
+
+def compile_layout(config: LayoutConfig) -> Layout:
+    return Layout(
+        date=_point(config.date),
+        title=_point(config.title),
+        buyer=(_point(config.buyer[0]), _point(config.buyer[1])),
+        sbp_text=_point(config.sbp_text),
+        images={
+            page: tuple(
+                ImagePlacement(
+                    image, x * mm, A4[1] - (top + height) * mm, width * mm, height * mm
+                )
+                for image, x, top, width, height in placements
+            )
+            for page, placements in config.images.items()
+        },
+    )
+
+
+def company_names() -> List[str]:
+    return sorted(
+        path.parent.name for path in contracts_path.glob(f"*/{TEMPLATE_FILE}")
+    )
+
+
+def _mtimes(files: List[pathlib.Path]) -> List[int]:
+    return [path.stat().st_mtime_ns for path in files]
+
+
+# Скомпилированные шаблоны по хэшу содержимого: повторная загрузка
+# неизмененных файлов не пересобирает шаблон
+_plans: Dict[str, ContractTemplate] = {}
+_loaded: Dict[str, _Loaded] = {}
+
+
+def load_template(
+    name: str,
+) -> Tuple[ContractTemplate, List[pathlib.Path], List[int]]:
+    directory = contracts_path.joinpath(name)
+    config_path = directory.joinpath(TEMPLATE_FILE)
+    if not config_path.is_file():
+        raise KeyError(name)
+    layout_path = contracts_path.joinpath(LAYOUT_FILE)
+
+    config = TemplateConfig.model_validate_json(config_path.read_bytes())
+    text_path = directory.joinpath(config.text)
+    images = {
+        image: (directory.joinpath(image_config.file), image_config.transparent_black)
+        for image, image_config in config.images.items()
+    }
+    files = [config_path, layout_path, text_path, *(path for path, _ in images.values())]
+    mtimes = _mtimes(files)
+
+    digest = hashlib.sha256()
+    for path in files:
+        content = path.read_bytes()
+        digest.update(len(content).to_bytes(8, "big"))
+        digest.update(content)
+    digest = digest.hexdigest()
+
+    template = _plans.get(digest)
+    if template is None:
+        layout = json.loads(layout_path.read_bytes())
+        layout.update(config.layout)
+        template = _plans[digest] = ContractTemplate(
+            digest=digest,
+            contract=Contract(
+                text=text_path.read_text(encoding="utf-8"),
+                company=config.company,
+                contract_executor_fio=config.contract_executor_fio,
+            ),
+            layout=compile_layout(LayoutConfig.model_validate(layout)),
+            images=images,
+        )
+    return template, files, mtimes
+
+
+def get_template(name: str) -> ContractTemplate:
+    loaded = _loaded.get(name)
+    now = time.monotonic()
+    if loaded is not None:
+        if now - loaded.checked < settings.template_check_interval:
+            return loaded.template
+        loaded.checked = now
+        try:
+            if _mtimes(loaded.files) == loaded.mtimes:
+                return loaded.template
+        except OSError:
+            pass
+
+    try:
+        template, files, mtimes = load_template(name)
+    except (OSError, ValueError) as e:
+        # Пока файл редактируют, продолжаем работать с последней рабочей версией
+        if loaded is None:
+            raise
+        logger.error(f"Template {name} is not reloaded: {e}")
+        return loaded.template
+
+    _loaded[name] = _Loaded(template, files, mtimes, now)
+    if loaded is not None and loaded.template is not template:
+        logger.info(f"Template {name} reloaded")
+        if all(item.template is not loaded.template for item in _loaded.values()):
+            _plans.pop(loaded.template.digest, None)
+    return template
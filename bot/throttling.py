@@ -0,0 +1,132 @@
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message, TelegramObject
+from loguru import logger
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from bot.metrics import throttled_updates
+from bot.settings import get_redis, settings
+
+# Token bucket: состояние и проверка в одном скрипте, чтобы лимит
+# был атомарным для всех реплик. Время берется у Redis, а не у реплик
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "ts", "warned")
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+local warned = tonumber(bucket[3]) or 0
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+local notify = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+    warned = 0
+else
+    retry_after = (1 - tokens) / rate
+    if warned == 0 then
+        notify = 1
+        warned = 1
+    end
+end
+redis.call(
+    "HSET", KEYS[1], "tokens", tostring(tokens), "ts", tostring(now), "warned", warned
+)
+redis.call("PEXPIRE", KEYS[1], math.ceil(burst / rate * 1000))
+return {allowed, tostring(retry_after), notify}
+"""
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    allowed: bool
+    retry_after: float = 0.0
+    # Предупреждаем только о первом отклоненном сообщении подряд
+    notify: bool = False
+
+
+class MemoryRateLimiter:
+    def __init__(self, rate: float, burst: int, max_items: int = 10_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_items = max_items
+        self._buckets: OrderedDict[int, List[float]] = OrderedDict()
+
+    async def hit(self, user_id: int) -> RateLimit:
+        now = time.monotonic()
+        tokens, ts, warned = self._buckets.pop(user_id, (self.burst, now, False))
+        tokens = min(self.burst, tokens + max(0.0, now - ts) * self.rate)
+        if tokens >= 1:
+            limit = RateLimit(True)
+            tokens -= 1
+            warned = False
+        else:
+            limit = RateLimit(False, (1 - tokens) / self.rate, not warned)
+            warned = True
+        self._buckets[user_id] = [tokens, now, warned]
+        if len(self._buckets) > self.max_items:
+            self._buckets.popitem(last=False)
+        return limit
+
+
+class RedisRateLimiter:
+    def __init__(self, redis: Redis, rate: float, burst: int, prefix: str = "throttle"):
+        self.rate = rate
+        self.burst = burst
+        self.prefix = prefix
+        self._script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def take(self, key: int | str) -> RateLimit:
+        allowed, retry_after, notify = await self._script(
+            keys=[f"{self.prefix}:{key}"], args=[self.rate, self.burst]
+        )
+        return RateLimit(bool(allowed), float(retry_after), bool(notify))
+
+    async def hit(self, user_id: int) -> RateLimit:
+        try:
+            return await self.take(user_id)
+        except RedisError as e:
+            # Без Redis лимит не применяется, чтобы бот продолжал работать
+            logger.warning(f"Rate limiter is unavailable: {e}")
+            return RateLimit(True)
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    def __init__(self, limiter: MemoryRateLimiter | RedisRateLimiter):
+        self.limiter = limiter
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+        limit = await self.limiter.hit(user.id)
+        if limit.allowed:
+            return await handler(event, data)
+        throttled_updates.inc()
+        if limit.notify and isinstance(event, Message):
+            await event.answer(
+                "Слишком много запросов. "
+                f"Повторите через {math.ceil(limit.retry_after)} с."
+            )
+
+
+def create_rate_limiter() -> MemoryRateLimiter | RedisRateLimiter:
+    redis = get_redis()
+    if redis is not None:
+        return RedisRateLimiter(redis, settings.rate_limit, settings.rate_limit_burst)
+    return MemoryRateLimiter(settings.rate_limit, settings.rate_limit_burst)
@@ -0,0 +1,68 @@
+import asyncio
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from loguru import logger
+from redis.exceptions import RedisError
+
+from bot.lifecycle import handle_signals
+from bot.metrics import metrics
+from bot.settings import settings
+
+
+async def set_webhook(bot: Bot):
+    await bot.set_webhook(
+        url=f"{settings.webhook_url.rstrip('/')}{settings.webhook_path}",
+        secret_token=settings.webhook_secret,
+        allowed_updates=["message"],
+    )
+    logger.info(f"Webhook is set to {settings.webhook_url}{settings.webhook_path}")
+
+
+def create_app(dispatcher: Dispatcher, bot: Bot) -> web.Application:
+    storage = dispatcher.storage
+
+    async def health(request: web.Request):
+        redis = getattr(storage, "redis", None)
+        if redis is not None:
+            try:
+                await redis.ping()
+            except RedisError as e:
+                return web.json_response({"status": "error", "error": str(e)}, status=503)
+        return web.json_response({"status": "ok"})
+
+    app = web.Application()
+    # Обработчики остановки выполняются по порядку регистрации: диспетчер
+    # дожидается рендеров раньше, чем обработчик вебхука закроет сессию бота
+    setup_application(app, dispatcher, bot=bot)
+    SimpleRequestHandler(
+        dispatcher=dispatcher, bot=bot, secret_token=settings.webhook_secret
+    ).register(app, path=settings.webhook_path)
+    app.router.add_get("/health", health)
+    app.router.add_get("/metrics", metrics)
+    return app
+
+
+async def run_webhook(dispatcher: Dispatcher, bot: Bot):
+    if not settings.webhook_url:
+        raise ValueError("WEBHOOK_URL is required in webhook mode")
+    if not settings.webhook_secret:
+        logger.warning("WEBHOOK_SECRET is not set, webhook requests are not verified")
+    if not settings.use_redis:
+        logger.warning("MemoryStorage is not shared between webhook replicas")
+    dispatcher.startup.register(set_webhook)
+
+    runner = web.AppRunner(create_app(dispatcher, bot))
+    await runner.setup()
+    site = web.TCPSite(runner, settings.webhook_host, settings.webhook_port)
+    await site.start()
+    logger.info(f"Listening on {settings.webhook_host}:{settings.webhook_port}")
+    stop = asyncio.Event()
+    handle_signals(stop.set)
+    try:
+        await stop.wait()
+    finally:
+        # Сначала закрывается порт: Telegram повторит доставку новых
+        # обновлений другой реплике, пока эта дожидается начатых рендеров
+        await runner.cleanup()
@@ -0,0 +1,38 @@
+import asyncio
+
+from bot.executor import render_executor
+from bot.jobs import get_job_queue
+from bot.lifecycle import handle_signals
+from bot.loguru_logger import configure_logging
+from bot.metrics import start_metrics_server
+from bot.settings import get_bot, get_storage, settings
+from bot.worker.worker import RenderWorker
+
+
+async def main():
+    configure_logging(logging_level=settings.log_level_number)
+    job_queue = get_job_queue()
+    if job_queue is None:
+        raise SystemExit("Render worker requires RENDER_QUEUE=true and Redis storage")
+    bot = get_bot()
+    storage = get_storage()
+    worker = RenderWorker(job_queue, bot, storage, settings.render_workers)
+    handle_signals(worker.stop)
+    # Рендеры в режиме очереди идут здесь, поэтому их метрики отдает воркер
+    metrics_runner = None
+    if settings.metrics_port is not None:
+        metrics_runner = await start_metrics_server()
+    await render_executor.warm_up()
+    try:
+        await worker.run()
+        await worker.drain(settings.shutdown_timeout)
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await render_executor.shutdown()
+        await bot.session.close()
+        await storage.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,164 @@
+import asyncio
+import os
+import socket
+from contextlib import suppress
+from typing import Dict, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from loguru import logger
+from redis.exceptions import RedisError
+
+from bot.delivery import send_document
+from bot.jobs import JobQueue, RenderJob
+from bot.messages import DONE_MESSAGE, ERROR_MESSAGE
+from bot.metrics import fsm_sessions_finished
+from bot.utils import contract_from_state, generate_pdf
+
+
+# Пауза перед повторным чтением потока, если Redis недоступен
+READ_RETRY_DELAY = 1
+
+
+class RenderWorker:
+    def __init__(
+        self,
+        queue: JobQueue,
+        bot: Bot,
+        storage: BaseStorage,
+        concurrency: int,
+        block: int = 5000,
+    ):
+        self.queue = queue
+        self.bot = bot
+        self.storage = storage
+        self.concurrency = concurrency
+        # Сколько миллисекунд XREADGROUP ждет новых задач: столько же
+        # воркер может не замечать остановку
+        self.block = block
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self.stopping = False
+        self._tasks: Dict[asyncio.Task, Tuple[bytes, RenderJob]] = {}
+
+    def start(self, message_id: bytes, job: RenderJob) -> asyncio.Task:
+        task = asyncio.create_task(self.process(message_id, job))
+        self._tasks[task] = (message_id, job)
+        task.add_done_callback(self._discard)
+        return task
+
+    def _discard(self, task: asyncio.Task):
+        self._tasks.pop(task, None)
+
+    def stop(self):
+        # Новые задачи не читаются, начатые дожидаются в drain
+        self.stopping = True
+
+    async def run(self):
+        await self.queue.setup()
+        logger.info(f"Render worker {self.consumer} is started")
+        while not self.stopping:
+            free = self.concurrency - len(self._tasks)
+            if free <= 0:
+                await asyncio.wait(self._tasks, return_when=asyncio.FIRST_COMPLETED)
+                continue
+            try:
+                jobs = await self.queue.read(self.consumer, free, block=self.block)
+            except RedisError as e:
+                logger.warning(f"Render queue is unavailable: {e}")
+                await asyncio.sleep(READ_RETRY_DELAY)
+                continue
+            for message_id, job in jobs:
+                if self.stopping:
+                    # Остановка пришла во время чтения: задача сразу уходит
+                    # другим воркерам
+                    await self.queue.release(message_id, job)
+                else:
+                    self.start(message_id, job)
+
+    async def drain(self, timeout: float):
+        if self._tasks:
+            logger.info(f"Waiting for {len(self._tasks)} render job(s) to finish")
+            await asyncio.wait(self._tasks, timeout=timeout)
+        unfinished = dict(self._tasks)
+        for task in unfinished:
+            task.cancel()
+        await asyncio.gather(*unfinished, return_exceptions=True)
+        # Прерванные задачи возвращаются в поток сразу, а не после claim_idle
+        for message_id, job in unfinished.values():
+            await self.queue.release(message_id, job)
+        if unfinished:
+            logger.warning(f"{len(unfinished)} render job(s) are returned to the queue")
+
+    async def status(self, job: RenderJob, text: str):
+        with suppress(TelegramBadRequest):
+            if job.status_message_id is None:
+                await self.bot.send_message(job.chat_id, text)
+            else:
+                await self.bot.edit_message_text(
+                    text, chat_id=job.chat_id, message_id=job.status_message_id
+                )
+
+    async def process(self, message_id: bytes, job: RenderJob):
+        if await self.queue.is_cancelled(job):
+            await self.queue.complete(message_id, job)
+            return
+        await self.status(
+            job,
+            "Генерация договора..."
+            if job.attempt == 1
+            else f"Генерация договора, попытка {job.attempt}...",
+        )
+
+        async def on_queued(position: int):
+            await self.status(job, f"Ваше место в очереди: {position}")
+
+        try:
+            document = await generate_pdf(
+                job.data, job.company_name, job.user_id, on_queued
+            )
+            with document:
+                # Итоговый статус правится одновременно с загрузкой документа
+                sent, _ = await asyncio.gather(
+                    send_document(self.bot, job.chat_id, document),
+                    self.status(job, DONE_MESSAGE),
+                    return_exceptions=True,
+                )
+            if isinstance(sent, BaseException):
+                raise sent
+        except Exception as e:
+            logger.error(f"Render job {job.key} failed on attempt {job.attempt}: {e}")
+            if not await self.queue.retry(message_id, job):
+                await self.status(job, ERROR_MESSAGE)
+            return
+
+        await self.queue.complete(message_id, job)
+        await self.clear_form(job)
+
+    async def clear_form(self, job: RenderJob):
+        # Пока задача ждала в очереди, пользователь мог начать новую форму:
+        # очищается только форма, из которой отправлен этот договор
+        state = FSMContext(
+            self.storage, StorageKey(self.bot.id, job.chat_id, job.user_id)
+        )
+        if await state.get_state() != job.fsm_state:
+            return
+        data = await state.get_data()
+        try:
+            contract_data = contract_from_state(data)
+        except ValueError:
+            return
+        company_name = data.get("company_name")
+        if company_name is None:
+            return
+        submitted = RenderJob.create(
+            job.chat_id, job.user_id, company_name, contract_data
+        )
+        if submitted.key != job.key:
+            return
+        await state.clear()
+        # Быстрая форма завершает сессию сама, еще в обработчике
+        if job.fsm_state is not None:
+            fsm_sessions_finished.inc()
+
@@ -0,0 +1,176 @@
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import random
+import resource
+import statistics
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from bot.executor import RenderExecutor
+from bot.models import ContractFormData
+from bot.render import render_pdf
+from bot.settings import settings
+from bot.static_layer import compile_static_layers
+from bot.templates import company_names
+
+WORDS = [
+    "Станок", "Юпитер", "Гранд", "9000", "с", "полным", "комплектом", "насадок",
+    "и", "дополнительным", "контроллером", "массой", "до", "50", "кг.", "улица",
+    "Остоженка", "дом", "квартира", "подъезд", "этаж", "Московская", "область",
+]
+
+
+def random_text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def make_fixtures(count: int, seed: int = 0) -> List[Tuple[ContractFormData, str]]:
+    rng = random.Random(seed)
+    companies = company_names()
+    fixtures = []
+    for i in range(count):
+        # Каждый четвертый договор - с длинными наименованием и адресом
+        long = i % 4 == 3
+        data = ContractFormData(
+            date=f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.2024",
+            contract_number=str(rng.randint(1000, 999999)),
+            first_name=rng.choice(["Людмила", "Ольга", "Иван", "Петр"]),
+            last_name=rng.choice(["Романова", "Васильева", "Иванов", "Петров"]),
+            middle_name=rng.choice(["Викторовна", "Алексеевна", "Сергеевич", "-"]),
+            phone=f"+7 (9{rng.randint(10, 99)}) {rng.randint(100, 999)}-12-34",
+            address=random_text(rng, 30 if long else 8),
+            ordered_item=random_text(rng, 40 if long else 8),
+            quantity=rng.randint(1, 100),
+            cost=rng.randint(0, 10_000_000),
+            sbp_phone=f"+7 (9{rng.randint(10, 99)}) {rng.randint(100, 999)}-56-78",
+            sbp_full_name=random_text(rng, 3),
+            sbp_bank=rng.choice(["РОСБАНК", "Сбербанк", "Т-Банк"]),
+        )
+        fixtures.append((data, companies[i % len(companies)]))
+    return fixtures
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def summarize(latencies: List[float], sizes: List[int], wall: float, cores: int) -> Dict:
+    return {
+        "count": len(latencies),
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "throughput_per_core": len(latencies) / wall / cores,
+        "size_mean_bytes": statistics.fmean(sizes),
+        "size_max_bytes": max(sizes),
+    }
+
+
+def bench_sequential(fixtures: List[Tuple[ContractFormData, str]]) -> Dict:
+    compile_static_layers()
+    latencies, sizes = [], []
+    started = time.perf_counter()
+    for data, contract_name in fixtures:
+        t = time.perf_counter()
+        document = render_pdf(data, contract_name)
+        latencies.append(time.perf_counter() - t)
+        with document:
+            sizes.append(len(document.read()))
+    return summarize(latencies, sizes, time.perf_counter() - started, 1)
+
+
+async def bench_concurrent(
+    fixtures: List[Tuple[ContractFormData, str]], workers: int
+) -> Dict:
+    executor = RenderExecutor(
+        workers=workers,
+        queue_size=len(fixtures),
+        timeout=600,
+        initializer=compile_static_layers,
+    )
+
+    async def job(data, contract_name):
+        t = time.perf_counter()
+        document = await executor.submit(None, render_pdf, data, contract_name)
+        latency = time.perf_counter() - t
+        with document:
+            return latency, len(document.read())
+
+    try:
+        await executor.warm_up()
+        started = time.perf_counter()
+        results = await asyncio.gather(*(job(*fixture) for fixture in fixtures))
+        wall = time.perf_counter() - started
+    finally:
+        await executor.shutdown()
+    latencies, sizes = zip(*results)
+    return summarize(list(latencies), list(sizes), wall, workers)
+
+
+def peak_rss_mb() -> Dict:
+    # ru_maxrss в Linux - в килобайтах
+    return {
+        "main": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "workers": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+def compare(result: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    regressions = []
+    for mode in ("sequential", "concurrent"):
+        for metric in ("p50_ms", "p95_ms", "size_mean_bytes"):
+            old, new = baseline[mode][metric], result[mode][metric]
+            if old and (new - old) / old > tolerance:
+                regressions.append(f"{mode}.{metric}: {old:.1f} -> {new:.1f}")
+        old = baseline[mode]["throughput_per_core"]
+        new = result[mode]["throughput_per_core"]
+        if old and (old - new) / old > tolerance:
+            regressions.append(f"{mode}.throughput_per_core: {old:.2f} -> {new:.2f}")
+    return regressions
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк генерации договоров")
+    parser.add_argument("--count", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", type=pathlib.Path, help="записать результат в JSON")
+    parser.add_argument("--compare", type=pathlib.Path, help="сравнить с JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument(
+        "--reportlab", action="store_true", help="без быстрого writer'а"
+    )
+    args = parser.parse_args()
+    if args.reportlab:
+        # Воркеры читают настройки из окружения при старте
+        settings.pdf_fast_writer = False
+        os.environ["PDF_FAST_WRITER"] = "false"
+
+    fixtures = make_fixtures(args.count, args.seed)
+    result = {
+        "count": args.count,
+        "workers": args.workers,
+        "fast_writer": settings.pdf_fast_writer,
+        "sequential": bench_sequential(fixtures),
+        "concurrent": await bench_concurrent(fixtures, args.workers),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    print(json.dumps(result, indent=2))
+
+    if args.save:
+        args.save.write_text(json.dumps(result, indent=2))
+    if args.compare:
+        regressions = compare(result, json.loads(args.compare.read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,57 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Dict
+
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.redis import RedisStorage
+
+from bot.storage import FormStorage
+from tests.conftest import LatencyConnection, fake_redis, fill_form, stored_bytes
+
+
+async def timed_form(storage: BaseStorage, user_id: int) -> float:
+    started = time.perf_counter()
+    await fill_form(storage, user_id)
+    return time.perf_counter() - started
+
+
+async def bench(storage: BaseStorage, users: int) -> Dict:
+    LatencyConnection.round_trips = 0
+    started = time.perf_counter()
+    latencies = await asyncio.gather(
+        *(timed_form(storage, user_id) for user_id in range(users))
+    )
+    wall = time.perf_counter() - started
+    round_trips = LatencyConnection.round_trips
+    size = await stored_bytes(storage.redis)
+    return {
+        "users": users,
+        "wall_ms": wall * 1000,
+        "form_mean_ms": statistics.fmean(latencies) * 1000,
+        "round_trips_per_form": round_trips / users,
+        "stored_bytes_per_form": size / users,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк FSM-хранилища")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.5, help="мс на round-trip")
+    args = parser.parse_args()
+
+    result = {
+        "stock": await bench(
+            RedisStorage(fake_redis(args.latency / 1000)), args.users
+        ),
+        "form": await bench(
+            FormStorage(fake_redis(args.latency / 1000), ttl=3600), args.users
+        ),
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,160 @@
+import asyncio
+import time
+from typing import Dict
+
+import pytest
+import pytest_asyncio
+from aiogram import Bot
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from fakeredis import FakeAsyncRedis
+
+from bot import delivery
+from bot.delivery import MemoryFileIdStore, create_session
+from bot.handlers.handler import Form
+from bot.jobs import JobQueue, RenderJob
+from bot.models import ContractFormData
+from bot.settings import settings
+from bot.storage import FormStorage, next_step
+
+# Общие для модулей тестов данные, фейки и фикстуры
+
+contract_data = {
+    "date": "07.07.2024",
+    "contract_number": "990178",
+    "first_name": "Людмила",
+    "last_name": "Романова",
+    "middle_name": "Викторовна",
+    "phone": "+7 (900) 788-90-12",
+    "address": "г. Москва, ул. Остоженка, д. 90, кв. 78",
+    "ordered_item": "Станок Юпитер Гранд 9000 с полным комплектом, 100% оригинал",
+    "quantity": "1",
+    "cost": "119990",
+    "sbp_phone": "+7 (990) 189-90-81",
+    "sbp_full_name": "Васильева Ольга Виктровна",
+    "sbp_bank": "РОСБАНК",
+}
+
+
+def make_job(**kwargs):
+    data = ContractFormData(**contract_data)
+    return RenderJob.create(1, 2, "prostor", data, status_message_id=10, **kwargs)
+
+
+class FakeBot:
+    id = 1
+
+    def __init__(self):
+        self.statuses = []
+        self.documents = []
+
+    async def edit_message_text(self, text, chat_id, message_id):
+        self.statuses.append(text)
+
+
+@pytest.fixture
+def queue():
+    redis = FakeAsyncRedis()
+    return JobQueue(redis, max_attempts=2, claim_idle=60, dedup_ttl=60)
+
+
+class MockBotApi:
+    # Локальный Bot API: отвечает успехом, если для метода не заданы ошибки
+    def __init__(self):
+        self.calls = []
+        self.errors = {}
+        self.delays = {}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        data = await request.post()
+        self.calls.append((method, time.monotonic(), data.get("text")))
+        await asyncio.sleep(self.delays.get(method, 0))
+        errors = self.errors.get(method)
+        if errors:
+            status, body = errors.pop(0)
+            body = {"ok": False, "error_code": status, **body}
+            return web.json_response(body, status=status)
+        message = {
+            "message_id": len(self.calls),
+            "date": 0,
+            "chat": {"id": 1, "type": "private"},
+        }
+        if method == "sendDocument":
+            message["document"] = {"file_id": "id", "file_unique_id": "uid"}
+        return web.json_response({"ok": True, "result": message})
+
+
+@pytest_asyncio.fixture
+async def api(monkeypatch):
+    mock = MockBotApi()
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", mock.handle)
+    server = TestServer(app)
+    await server.start_server()
+    monkeypatch.setattr(settings, "telegram_api_url", str(server.make_url("/")))
+    monkeypatch.setattr(settings, "telegram_retry_backoff", 0.01)
+    monkeypatch.setattr(settings, "telegram_chat_rate", 100)
+    monkeypatch.setattr(delivery, "get_file_ids", MemoryFileIdStore)
+    yield mock
+    await server.close()
+
+
+@pytest_asyncio.fixture
+async def bot(api):
+    bot = Bot(token="1:test", session=create_session())
+    yield bot
+    await bot.session.close()
+
+
+class LatencyConnection:
+    # Каждая отправка команды или пайплайна - один round-trip до Redis
+    latency = 0.0
+    round_trips = 0
+
+    async def send_packed_command(self, *args, **kwargs):
+        LatencyConnection.round_trips += 1
+        if LatencyConnection.latency:
+            await asyncio.sleep(LatencyConnection.latency)
+        return await super().send_packed_command(*args, **kwargs)
+
+
+def fake_redis(latency: float = 0.0) -> FakeAsyncRedis:
+    redis = FakeAsyncRedis()
+    LatencyConnection.latency = latency
+    pool = redis.connection_pool
+    pool.connection_class = type(
+        "FakeLatencyConnection", (LatencyConnection, pool.connection_class), {}
+    )
+    return redis
+
+
+async def write_step(state: FSMContext, next_state, **data):
+    if isinstance(state.storage, FormStorage):
+        await next_step(state, next_state, **data)
+    else:
+        await state.update_data(data)
+        await state.set_state(next_state)
+
+
+async def fill_form(storage: BaseStorage, user_id: int) -> Dict:
+    # Шаги формы в том порядке, в каком их проходит пользователь
+    state = FSMContext(storage, StorageKey(bot_id=1, chat_id=user_id, user_id=user_id))
+    await write_step(state, Form.date, company_name="prostor", items=[])
+    states = [*Form.__states__, None]
+    for current, next_state in zip(states, states[1:]):
+        field = current.state.split(":")[1]
+        await write_step(state, next_state, **{field: contract_data[field]})
+    return await state.get_data()
+
+
+async def stored_bytes(redis) -> int:
+    size = 0
+    for key in await redis.keys("fsm:*"):
+        if await redis.type(key) == b"hash":
+            size += sum(len(k) + len(v) for k, v in (await redis.hgetall(key)).items())
+        else:
+            size += await redis.strlen(key)
+    return size
@@ -0,0 +1,34 @@
+import os
+
+from PIL import Image
+
+from bot.assets import black_to_alpha, load_image
+
+
+def test_black_to_alpha():
+    img = Image.new("RGBA", (2, 2), (0, 0, 0, 255))
+    img.putpixel((0, 1), (10, 0, 0, 255))
+    img.putpixel((1, 1), (20, 30, 40, 128))
+    assert list(black_to_alpha(img).getdata()) == [
+        (255, 255, 255, 0),
+        (255, 255, 255, 0),
+        (10, 0, 0, 255),
+        (20, 30, 40, 128),
+    ]
+
+
+def test_load_image_reloads_on_mtime(tmp_path):
+    path = tmp_path.joinpath("sig.png")
+    Image.new("RGB", (4, 4), (0, 0, 0)).save(path)
+    source = path.read_bytes()
+
+    reader = load_image(path, transparent_black=True)
+    assert load_image(path, transparent_black=True) is reader
+    assert path.read_bytes() == source
+
+    Image.new("RGB", (8, 8), (0, 0, 0)).save(path)
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    reloaded = load_image(path, transparent_black=True)
+    assert reloaded is not reader
+    assert reloaded.getSize() == (8, 8)
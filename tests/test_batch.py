@@ -0,0 +1,53 @@
+import json
+import zipfile
+
+import pytest
+
+from bot.batch.batch import BatchArchive, read_rows, run_batch, validate_rows
+from bot.executor import render_executor
+from tests.conftest import contract_data
+
+
+def test_read_rows():
+    content = "first_name;cost\nИван;10\n".encode("utf-8-sig")
+    assert read_rows("rows.csv", content) == [{"first_name": "Иван", "cost": "10"}]
+    assert read_rows("rows.json", json.dumps([contract_data]).encode()) == [
+        contract_data
+    ]
+
+
+def test_validate_rows():
+    rows = [
+        contract_data,
+        {**contract_data, "quantity": "0"},
+        {**contract_data, "company_name": "unknown"},
+        {**contract_data, "company_name": "stroytorgcomplect"},
+    ]
+    items, errors = validate_rows(rows, "prostor")
+    assert [(i.row, i.company_name) for i in items] == [
+        (1, "prostor"),
+        (4, "stroytorgcomplect"),
+    ]
+    assert [(e.row, e.field) for e in errors] == [(3, "company_name"), (2, "quantity")]
+
+
+@pytest.mark.asyncio
+async def test_run_batch(tmp_path):
+    rows = [contract_data, {**contract_data, "cost": "-1"}, contract_data]
+    volumes = []
+
+    async def on_volume(path):
+        volumes.append(path)
+
+    archive = BatchArchive(tmp_path.joinpath("out.zip"), max_size=1, on_volume=on_volume)
+    try:
+        rendered, errors = await run_batch(rows, archive, "prostor")
+    finally:
+        await render_executor.shutdown()
+
+    assert rendered == 2
+    assert [(e.row, e.field) for e in errors] == [(2, "cost")]
+    names = [name for path in volumes for name in zipfile.ZipFile(path).namelist()]
+    assert len(volumes) == 3
+    assert names[-1] == "errors.csv"
+    assert sorted(name[:4] for name in names[:-1]) == ["0001", "0003"]
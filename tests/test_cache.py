@@ -0,0 +1,38 @@
+import pytest
+
+from bot.cache import DiskRenderCache, MemoryRenderCache, render_key
+from bot.models import ContractFormData
+from tests.conftest import contract_data
+
+
+def test_render_key():
+    data = ContractFormData(**contract_data)
+    key = render_key(data, "prostor")
+    assert key == render_key(ContractFormData(**contract_data), "prostor")
+    assert key != render_key(data, "stroytorgcomplect")
+    assert key != render_key(data.model_copy(update={"cost": 1}), "prostor")
+
+
+@pytest.mark.asyncio
+async def test_memory_render_cache():
+    cache = MemoryRenderCache(max_size=10)
+    await cache.set("a", "A", b"12345")
+    await cache.set("b", "B", b"12345")
+    assert await cache.get("a") == ("A", b"12345")
+    await cache.set("c", "C", b"123")
+    assert await cache.get("b") is None
+    assert await cache.get("a") is not None
+    assert cache.size == 8
+    await cache.set("d", "D", b"x" * 11)
+    assert await cache.get("d") is None
+
+
+@pytest.mark.asyncio
+async def test_disk_render_cache(tmp_path):
+    cache = DiskRenderCache(tmp_path, max_size=40)
+    await cache.set("a", "Договор", b"%PDF" * 4)
+    assert await cache.get("a") == ("Договор", b"%PDF" * 4)
+    await cache.set("b", "B", b"%PDF" * 4)
+    assert await cache.get("a") is None
+    assert await cache.get("b") == ("B", b"%PDF" * 4)
+    assert DiskRenderCache(tmp_path, max_size=40).size == cache.size
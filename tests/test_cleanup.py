@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from bot.cleanup import CleanupScheduler
+
+
+class FakeBot:
+    def __init__(self):
+        self.deleted = []
+
+    async def delete_messages(self, chat_id, message_ids):
+        self.deleted.append((chat_id, message_ids))
+        return True
+
+
+@pytest.mark.asyncio
+async def test_cleanup_deletes_due_messages_in_batches():
+    scheduler = CleanupScheduler(max_pending=100)
+    bot = FakeBot()
+    scheduler.schedule(bot, 1, [10, 11], 0.05)
+    scheduler.schedule(bot, 1, [12, 13], 0.05)
+    scheduler.schedule(bot, 2, [20, 21], 60)
+    assert bot.deleted == []
+
+    await asyncio.sleep(0.1)
+    assert bot.deleted == [(1, [10, 11, 12, 13])]
+    assert scheduler.pending == 1
+
+    # При остановке оставшиеся сообщения удаляются без ожидания
+    await scheduler.shutdown()
+    assert bot.deleted[-1] == (2, [20, 21])
+    assert scheduler.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_cleanup_is_bounded():
+    scheduler = CleanupScheduler(max_pending=2)
+    bot = FakeBot()
+    for message_id in range(5):
+        scheduler.schedule(bot, 1, [message_id], 60 + message_id)
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    assert bot.deleted == [(1, [0, 1, 2])]
+    assert scheduler.pending == 2
+    await scheduler.shutdown()
+    assert bot.deleted[-1] == (1, [3, 4])
@@ -0,0 +1,258 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramNetworkError,
+    TelegramServerError,
+)
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.methods import SendDocument
+from aiogram.types import BufferedInputFile, Chat, Message, User
+from prometheus_client import REGISTRY
+
+from bot import delivery
+from bot.delivery import MemoryFileIdStore, SendGovernor, create_session, send_document
+from bot.document import RenderedPdf
+from bot.jobs import STREAM
+from bot.handlers import handler
+from bot.handlers.handler import send_contract
+from bot.messages import DONE_MESSAGE, ERROR_MESSAGE, OVERLOAD_MESSAGE
+from bot.models import ContractFormData
+from bot.settings import settings
+from tests.conftest import contract_data
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+        self.stale = set()
+
+    async def send_document(self, chat_id, document):
+        if document in self.stale:
+            raise TelegramBadRequest(SendDocument(chat_id=1, document=document), "")
+        self.sent.append(document)
+        file_id = document if isinstance(document, str) else f"id{len(self.sent)}"
+        return SimpleNamespace(document=SimpleNamespace(file_id=file_id))
+
+
+@pytest.mark.asyncio
+async def test_send_document_reuses_file_id(monkeypatch):
+    file_ids = MemoryFileIdStore()
+    monkeypatch.setattr(delivery, "get_file_ids", lambda: file_ids)
+    bot = FakeBot()
+    document = RenderedPdf("Договор", data=b"%PDF-1.4")
+
+    await send_document(bot, 1, document)
+    await send_document(bot, 1, RenderedPdf("Договор", data=b"%PDF-1.4"))
+    assert isinstance(bot.sent[0], BufferedInputFile)
+    assert bot.sent[1] == "id1"
+
+    bot.stale.add("id1")
+    await send_document(bot, 1, document)
+    assert isinstance(bot.sent[2], BufferedInputFile)
+    assert await file_ids.get(document.digest) == "id3"
+
+
+@pytest.mark.asyncio
+async def test_retry_after_is_respected(api, bot):
+    api.errors["sendMessage"] = [
+        (429, {"description": "Too Many Requests", "parameters": {"retry_after": 1}})
+    ]
+    await bot.send_message(1, "Пожалуйста, ожидайте...")
+    (_, first, _), (_, second, _) = api.calls
+    assert second - first >= 1
+
+
+@pytest.mark.asyncio
+async def test_server_errors_are_retried(api, bot):
+    bad_gateway = (502, {"description": "Bad Gateway"})
+    api.errors["editMessageText"] = [bad_gateway] * 2
+    await bot.edit_message_text("Готово", chat_id=1, message_id=1)
+    assert [method for method, *_ in api.calls] == ["editMessageText"] * 3
+
+    retries = settings.telegram_max_retries
+    api.errors["editMessageText"] = [bad_gateway] * (retries + 1)
+    with pytest.raises(TelegramServerError):
+        await bot.edit_message_text("Готово", chat_id=1, message_id=1)
+
+    # Документ мог уже дойти до пользователя, повтор прислал бы дубликат
+    api.calls.clear()
+    api.errors["sendDocument"] = [bad_gateway]
+    with pytest.raises(TelegramServerError):
+        await send_document(bot, 1, RenderedPdf("Договор", data=b"%PDF-1.4"))
+    assert [method for method, *_ in api.calls] == ["sendDocument"]
+
+
+@pytest.mark.asyncio
+async def test_sends_are_not_retried_after_timeout(api, bot):
+    api.delays["sendMessage"] = 0.5
+    with pytest.raises(TelegramNetworkError):
+        await bot.send_message(1, "Пожалуйста, ожидайте...", request_timeout=0.1)
+    await asyncio.sleep(0.5)
+    # Telegram получил запрос один раз, хотя ответа бот не дождался
+    assert [method for method, *_ in api.calls] == ["sendMessage"]
+
+
+@pytest.mark.asyncio
+async def test_sends_are_retried_when_not_connected(monkeypatch):
+    monkeypatch.setattr(settings, "telegram_api_url", "http://127.0.0.1:1/")
+    monkeypatch.setattr(settings, "telegram_retry_backoff", 0.01)
+    bot = Bot(token="1:test", session=create_session())
+    retries = REGISTRY.get_sample_value(
+        "bot_telegram_retries_total", {"reason": "TelegramNetworkError"}
+    )
+    try:
+        with pytest.raises(TelegramNetworkError):
+            await bot.send_message(1, "Пожалуйста, ожидайте...")
+    finally:
+        await bot.session.close()
+    assert REGISTRY.get_sample_value(
+        "bot_telegram_retries_total", {"reason": "TelegramNetworkError"}
+    ) == (retries or 0) + settings.telegram_max_retries
+
+
+@pytest.mark.asyncio
+async def test_send_governor_limits_each_chat():
+    governor = SendGovernor(rate=100, burst=100, chat_rate=20, chat_burst=1)
+    started = time.monotonic()
+    for _ in range(3):
+        await governor.acquire(1)
+    assert time.monotonic() - started >= 0.1
+    # Другой чат не ждет чужой очереди
+    started = time.monotonic()
+    await governor.acquire(2)
+    assert time.monotonic() - started < 0.05
+
+
+@pytest.mark.asyncio
+async def test_send_governor_shares_global_limit():
+    # Бот и воркер рендера отправляют сообщения через один лимит в Redis
+    server = fakeredis.FakeServer()
+    redis = fakeredis.FakeAsyncRedis(server=server)
+    governors = [
+        SendGovernor(rate=20, burst=2, chat_rate=100, chat_burst=100, redis=redis)
+        for _ in range(2)
+    ]
+    started = time.monotonic()
+    await asyncio.gather(
+        *(governor.acquire(chat_id) for governor in governors for chat_id in range(3))
+    )
+    # Два токена сразу, остальные четыре - по одному за 50 мс
+    assert time.monotonic() - started >= 0.2
+
+    # Без Redis общий лимит считается локально
+    server.connected = False
+    started = time.monotonic()
+    for _ in range(3):
+        await governors[0].acquire(1)
+    assert 0.05 <= time.monotonic() - started < 0.2
+
+
+@pytest.mark.asyncio
+async def test_send_contract_pipelines_status(api, bot, monkeypatch):
+    async def fake_generate_pdf(data, company_name, owner_id, on_queued):
+        return RenderedPdf("Договор", data=b"%PDF-1.4")
+
+    monkeypatch.setattr(handler, "generate_pdf", fake_generate_pdf)
+    monkeypatch.setattr(handler, "get_job_queue", lambda: None)
+    message = Message(
+        message_id=1,
+        date=0,
+        chat=Chat(id=1, type="private"),
+        from_user=User(id=1, is_bot=False, first_name="Test"),
+        text="РОСБАНК",
+    ).as_(bot)
+    state = FSMContext(MemoryStorage(), StorageKey(bot.id, 1, 1))
+    data = ContractFormData(**contract_data)
+
+    api.delays["sendDocument"] = 0.3
+    await send_contract(message, state, data, "prostor")
+    calls = {method: (started, text) for method, started, text in api.calls}
+    assert calls["editMessageText"][1] == DONE_MESSAGE
+    # Статус правится, пока документ еще загружается
+    assert calls["editMessageText"][0] < calls["sendDocument"][0] + 0.3
+
+    api.calls.clear()
+    api.errors["sendDocument"] = [(400, {"description": "Bad Request"})]
+    await send_contract(message, state, data, "prostor")
+    assert api.calls[-1][2] == ERROR_MESSAGE
+
+
+@pytest.mark.asyncio
+async def test_send_contract_reports_queue_errors(api, bot, monkeypatch):
+    class FakeQueue:
+        def __init__(self, error=None):
+            self.jobs = []
+            self.error = error
+
+        async def admit(self):
+            return 0
+
+        async def enqueue(self, job):
+            if self.error is not None:
+                raise self.error
+            self.jobs.append(job)
+            return True
+
+    message = Message(
+        message_id=1,
+        date=0,
+        chat=Chat(id=1, type="private"),
+        from_user=User(id=1, is_bot=False, first_name="Test"),
+        text="РОСБАНК",
+    ).as_(bot)
+    state = FSMContext(MemoryStorage(), StorageKey(bot.id, 1, 1))
+    data = ContractFormData(**contract_data)
+
+    # Статус не отправился, но задача все равно уходит воркеру
+    queue = FakeQueue()
+    monkeypatch.setattr(handler, "get_job_queue", lambda: queue)
+    api.errors["sendMessage"] = [(400, {"description": "Bad Request"})]
+    await send_contract(message, state, data, "prostor")
+    [job] = queue.jobs
+    assert job.status_message_id is None
+
+    api.calls.clear()
+    monkeypatch.setattr(handler, "get_job_queue", lambda: FakeQueue(ValueError()))
+    await send_contract(message, state, data, "prostor")
+    assert [(method, text) for method, _, text in api.calls][-1] == (
+        "editMessageText",
+        ERROR_MESSAGE,
+    )
+
+
+@pytest.mark.asyncio
+async def test_send_contract_queue_admission(api, bot, queue, monkeypatch):
+    monkeypatch.setattr(handler, "get_job_queue", lambda: queue)
+    queue.max_backlog = 2
+    state = FSMContext(MemoryStorage(), StorageKey(bot.id, 1, 1))
+
+    async def submit(user_id):
+        message = Message(
+            message_id=1,
+            date=0,
+            chat=Chat(id=1, type="private"),
+            from_user=User(id=user_id, is_bot=False, first_name="Test"),
+            text="РОСБАНК",
+        ).as_(bot)
+        api.calls.clear()
+        await send_contract(message, state, ContractFormData(**contract_data), "prostor")
+        return [text for method, _, text in api.calls if method == "editMessageText"]
+
+    assert await submit(1) == []
+    # Перед задачей уже есть ожидающая - пользователь видит свое место
+    assert await submit(2) == ["Ваше место в очереди: 2"]
+    # Очередь заполнена - договор не ставится, а пользователь видит отказ
+    assert await submit(3) == [OVERLOAD_MESSAGE]
+    assert await queue.redis.xlen(STREAM) == 2
+
+    # Задача, уже выданная воркеру, не считается ожидающей
+    await queue.read("w1", 1)
+    assert await queue.backlog() == 1
@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+import pytest
+
+from bot.document import RenderedPdf
+from bot.executor import RenderCancelled, RenderExecutor, RenderQueueFull
+
+
+def slow_spooled_pdf(path: str) -> RenderedPdf:
+    time.sleep(0.5)
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4")
+    return RenderedPdf("Договор", path=path)
+
+
+@pytest.mark.asyncio
+async def test_render_executor_timeout():
+    executor = RenderExecutor(workers=1, queue_size=0, timeout=0.5)
+    try:
+        assert await executor.submit(1, pow, 2, 10) == 1024
+        with pytest.raises(asyncio.TimeoutError):
+            await executor.submit(1, time.sleep, 1)
+        # Процесс все еще занят: слот не возвращается до конца задачи
+        executor.timeout = 0.1
+        with pytest.raises(RenderQueueFull):
+            await executor.submit(2, pow, 2, 2)
+        executor.timeout = 5
+        assert await executor.submit(2, pow, 2, 2) == 4
+    finally:
+        await executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_render_executor_backpressure_and_cancel():
+    executor = RenderExecutor(workers=1, queue_size=0, timeout=5)
+    try:
+        job = asyncio.create_task(executor.submit(1, time.sleep, 1))
+        await asyncio.sleep(0.1)
+        executor.timeout = 0.1
+        with pytest.raises(RenderQueueFull):
+            await executor.submit(2, pow, 2, 2)
+
+        assert executor.cancel(1) == 1
+        with pytest.raises(RenderCancelled):
+            await job
+        assert executor.cancel(1) == 0
+    finally:
+        await executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_render_executor_admission_control():
+    executor = RenderExecutor(workers=1, queue_size=4, timeout=5, max_backlog=1)
+    positions = []
+
+    async def on_queued(position):
+        positions.append(position)
+
+    try:
+        running = asyncio.create_task(executor.submit(1, time.sleep, 0.5))
+        await asyncio.sleep(0.1)
+        queued = asyncio.create_task(
+            executor.submit(2, pow, 2, 2, on_queued=on_queued)
+        )
+        await asyncio.sleep(0.1)
+        assert executor.backlog == 1
+        with pytest.raises(RenderQueueFull):
+            await executor.submit(3, pow, 2, 3)
+
+        await running
+        assert await queued == 4
+        assert positions == [1]
+        assert executor.backlog == 0
+    finally:
+        await executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_render_executor_removes_abandoned_documents(tmp_path):
+    executor = RenderExecutor(workers=2, queue_size=0, timeout=0.2)
+    timed_out = tmp_path.joinpath("timed_out.pdf")
+    cancelled = tmp_path.joinpath("cancelled.pdf")
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            await executor.submit(1, slow_spooled_pdf, str(timed_out))
+        executor.timeout = 5
+        job = asyncio.create_task(executor.submit(2, slow_spooled_pdf, str(cancelled)))
+        await asyncio.sleep(0.1)
+        executor.cancel(2)
+        with pytest.raises(RenderCancelled):
+            await job
+        await asyncio.sleep(1)
+        # Документы дописаны уже после отказа и удалены вслед за этим
+        assert not timed_out.exists() and not cancelled.exists()
+    finally:
+        await executor.shutdown()
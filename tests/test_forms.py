@@ -0,0 +1,81 @@
+import pytest
+from aiogram import Dispatcher
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Update
+from pydantic import ValidationError
+
+from bot.handlers.handler import Form, form_router, form_validators
+from bot.models import ContractFormData
+from bot.utils import contract_from_state
+
+form_data = {
+    "date": "07.07.2024",
+    "contract_number": "990178",
+    "first_name": "Людмила",
+    "last_name": "Романова",
+    "middle_name": "Викторовна",
+    "phone": "+7 (900) 788-90-12",
+    "address": "г. Москва, ул. Остоженка, д. 90, кв. 78",
+    "sbp_phone": "+7 (990) 189-90-81",
+    "sbp_full_name": "Васильева Ольга Виктровна",
+    "sbp_bank": "РОСБАНК",
+}
+
+
+def test_form_validators_return_typed_values():
+    assert form_validators.validate(Form.quantity, "3") == 3
+    assert form_validators.validate(Form.date, "07.07.2024") == "07.07.2024"
+
+    with pytest.raises(ValidationError) as e:
+        form_validators.validate(Form.cost, "сто")
+    assert e.value.errors()[0]["loc"] == ("cost",)
+
+
+def test_contract_from_state():
+    items = [{"name": "Станок Юпитер", "quantity": 1, "cost": 119990}]
+    contract = contract_from_state({**form_data, "items": items, "company_name": "x"})
+    expected = ContractFormData(**form_data, items=items)
+    assert contract == expected
+    assert contract.total == 119990
+
+    with pytest.raises(ValueError, match="items"):
+        contract_from_state(form_data)
+    data = {**form_data, "items": items}
+    del data["sbp_bank"]
+    with pytest.raises(ValueError, match="sbp_bank"):
+        contract_from_state(data)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("step", [Form.ordered_item, Form.quantity, Form.cost])
+async def test_form_rejects_non_text_items(api, bot, step):
+    dp = Dispatcher(storage=MemoryStorage())
+    dp.include_router(form_router)
+    try:
+        state = dp.fsm.get_context(bot, chat_id=1, user_id=1)
+        await state.set_state(step)
+        await state.set_data({"ordered_item": "Станок", "quantity": 1})
+        photo = Update.model_validate(
+            {
+                "update_id": 1,
+                "message": {
+                    "message_id": 1,
+                    "date": 0,
+                    "chat": {"id": 1, "type": "private"},
+                    "from": {"id": 1, "is_bot": False, "first_name": "Test"},
+                    "photo": [
+                        {"file_id": "id", "file_unique_id": "uid", "width": 1, "height": 1}
+                    ],
+                },
+            }
+        )
+        await dp.feed_update(bot, photo)
+
+        # Форма остается на том же шаге, а пользователь видит ошибку
+        assert await state.get_state() == step.state
+        assert "items" not in await state.get_data()
+        assert [method for method, *_ in api.calls] == ["sendMessage"]
+        assert step.state.rsplit(":", 1)[1] in api.calls[0][2]
+    finally:
+        # Роутер модуля подключается только к одному диспетчеру за раз
+        form_router._parent_router = None
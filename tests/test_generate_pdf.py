@@ -1,9 +1,8 @@
 import pytest
-from aiogram import types
 from loguru import logger
 
 from bot.models import ContractFormData
-from bot.settings import settings, bot
+from bot.settings import get_bot, settings
 from bot.utils import generate_pdf
 
 
@@ -44,7 +43,7 @@ async def test_generate_pdf():
         },
     ]
     for i, item in enumerate(data):
-        doc_name, file = await generate_pdf(ContractFormData(**item), contract_name=item["contract_name"])
-        file_buffered = types.FSInputFile(file.name, filename=f"{doc_name}.pdf")
-        await bot.send_document(settings.test_user_id, file_buffered)
+        document = await generate_pdf(ContractFormData(**item), contract_name=item["contract_name"])
+        with document:
+            await get_bot().send_document(settings.test_user_id, document.input_file())
         logger.debug(i)
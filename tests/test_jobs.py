@@ -0,0 +1,121 @@
+import pytest
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from bot.document import RenderedPdf
+from bot.handlers.handler import Form
+from bot.jobs import DEAD_STREAM, STREAM
+from bot.models import ContractFormData
+from bot.worker import worker
+from bot.worker.worker import RenderWorker
+from tests.conftest import FakeBot, contract_data, make_job
+
+
+@pytest.mark.asyncio
+async def test_job_queue_dedup_and_retry(queue):
+    await queue.setup()
+    job = make_job()
+    assert await queue.enqueue(job)
+    assert not await queue.enqueue(make_job())
+
+    [(message_id, received)] = await queue.read("w1", 10)
+    assert received == job
+    assert await queue.retry(message_id, received)
+
+    [(message_id, received)] = await queue.read("w1", 10)
+    assert received.attempt == 2
+    # Попытки закончились - задача уходит в dead-letter, ключ освобождается
+    assert not await queue.retry(message_id, received)
+    assert await queue.redis.xlen(DEAD_STREAM) == 1
+    assert await queue.redis.xlen(STREAM) == 0
+    assert await queue.enqueue(make_job())
+
+
+@pytest.mark.asyncio
+async def test_job_queue_reclaims_abandoned_jobs(queue):
+    await queue.setup()
+    await queue.enqueue(make_job())
+    assert len(await queue.read("crashed", 10)) == 1
+
+    queue.claim_idle = 0
+    [(_, received)] = await queue.read("w2", 10)
+    assert received.attempt == 2
+
+
+@pytest.mark.asyncio
+async def test_render_worker_process(queue, monkeypatch):
+    async def fake_generate_pdf(data, company_name, owner_id, on_queued):
+        return RenderedPdf("Договор", data=b"%PDF-1.4")
+
+    async def fake_send_document(bot, chat_id, document):
+        bot.documents.append(document.file_name)
+
+    monkeypatch.setattr(worker, "generate_pdf", fake_generate_pdf)
+    monkeypatch.setattr(worker, "send_document", fake_send_document)
+
+    bot = FakeBot()
+    render_worker = RenderWorker(queue, bot, MemoryStorage(), concurrency=2)
+    await queue.setup()
+    await queue.enqueue(make_job())
+    [(message_id, job)] = await queue.read(render_worker.consumer, 1)
+    await render_worker.process(message_id, job)
+
+    assert bot.documents == ["Договор"]
+    assert bot.statuses[-1].startswith("Готово")
+    assert await queue.redis.xlen(STREAM) == 0
+    assert await queue.enqueue(make_job())
+
+    # Задачи, созданные до /start, пропускаются
+    await queue.cancel(2)
+    [(message_id, job)] = await queue.read(render_worker.consumer, 1)
+    await render_worker.process(message_id, job)
+    assert bot.documents == ["Договор"]
+
+
+@pytest.mark.asyncio
+async def test_render_worker_keeps_new_form(queue, monkeypatch):
+    async def fake_generate_pdf(data, company_name, owner_id, on_queued):
+        return RenderedPdf("Договор", data=b"%PDF-1.4")
+
+    async def fake_send_document(bot, chat_id, document):
+        bot.documents.append(document.file_name)
+
+    monkeypatch.setattr(worker, "generate_pdf", fake_generate_pdf)
+    monkeypatch.setattr(worker, "send_document", fake_send_document)
+
+    bot = FakeBot()
+    storage = MemoryStorage()
+    state = FSMContext(storage, StorageKey(bot.id, 1, 2))
+    render_worker = RenderWorker(queue, bot, storage, concurrency=2)
+    await queue.setup()
+
+    async def submit(fsm_state):
+        job = make_job()
+        job.fsm_state = fsm_state
+        await queue.enqueue(job)
+        [(message_id, job)] = await queue.read(render_worker.consumer, 1)
+        await render_worker.process(message_id, job)
+
+    # Форма, из которой отправлен договор, очищается
+    data = ContractFormData(**contract_data).model_dump(exclude_none=True)
+    submitted = {**data, "company_name": "prostor"}
+    await state.set_data(submitted)
+    await state.set_state(Form.sbp_bank)
+    await submit(Form.sbp_bank.state)
+    assert await state.get_state() is None
+    assert await state.get_data() == {}
+
+    # Пока договор генерировался, пользователь начал новую форму
+    await state.set_data({"company_name": "prostor"})
+    await state.set_state(Form.date)
+    await submit(Form.sbp_bank.state)
+    assert await state.get_state() == Form.date.state
+    assert await state.get_data() == {"company_name": "prostor"}
+
+    # Или отправил быструю форму с другими данными
+    await state.set_data({**submitted, "contract_number": "990179"})
+    await state.set_state(None)
+    await submit(None)
+    assert (await state.get_data())["contract_number"] == "990179"
+    assert bot.documents == ["Договор"] * 3
@@ -0,0 +1,52 @@
+import pytest
+from reportlab.lib.units import mm
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from bot.layout import ELLIPSIS, fit_text, string_width, wrap
+
+item = (
+    "Станок Юпитер Гранд 9000 с полным комплектом насадок и дополнительным "
+    "контроллером, массой до 50 кг, 100% оригинал"
+)
+
+
+@pytest.mark.parametrize("font_name", ["FreeSans", "FreeSansBold"])
+def test_string_width_matches_reportlab(font_name):
+    assert string_width(item, font_name, 8) == pytest.approx(
+        stringWidth(item, font_name, 8)
+    )
+
+
+def test_wrap_fits_width():
+    lines = wrap(item, "FreeSans", 8, 66 * mm)
+    assert len(lines) > 1
+    assert " ".join(lines) == item
+    assert all(stringWidth(line, "FreeSans", 8) <= 66 * mm for line in lines)
+
+
+def test_wrap_breaks_long_words():
+    word = "Ж" * 100
+    lines = wrap(word, "FreeSans", 8, 20 * mm)
+    assert "".join(lines) == word
+    assert all(stringWidth(line, "FreeSans", 8) <= 20 * mm for line in lines)
+
+
+def test_fit_text_shrinks_font():
+    block = fit_text(item, "FreeSans", 8, 66 * mm, 6 * mm, 6)
+    assert block.font_size < 8
+    assert block.height <= 6 * mm
+    assert " ".join(block.lines) == item
+
+
+def test_fit_text_ellipsizes_at_min_size():
+    block = fit_text(item * 5, "FreeSans", 8, 66 * mm, 0, 6)
+    assert block.font_size == 6
+    assert len(block.lines) == 1
+    assert block.lines[0].endswith(ELLIPSIS)
+    assert stringWidth(block.lines[0], "FreeSans", 6) <= 66 * mm
+
+
+def test_fit_text_grows_without_max_height():
+    block = fit_text(item * 5, "FreeSans", 8, 66 * mm)
+    assert block.font_size == 8
+    assert block.height == (len(block.lines) - 1) * block.leading
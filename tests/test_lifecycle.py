@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+from aiogram import Dispatcher
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from bot import lifecycle as lifecycle_module
+from bot.document import RenderedPdf
+from bot.jobs import STREAM
+from bot.lifecycle import Lifecycle
+from bot.worker import worker
+from bot.worker.worker import RenderWorker
+from tests.conftest import FakeBot, make_job
+
+
+@pytest.fixture
+def queue(queue, monkeypatch):
+    monkeypatch.setattr(lifecycle_module, "get_stream_queue", lambda: queue)
+    return queue
+
+
+async def render(lifecycle: Lifecycle, seconds: float, done: list, job=None):
+    async with lifecycle.render(job):
+        await asyncio.sleep(seconds)
+        done.append(seconds)
+
+
+@pytest.mark.asyncio
+async def test_shutdown_drains_and_persists_renders(queue):
+    lifecycle = Lifecycle(drain_timeout=0.2)
+    done = []
+    job = make_job()
+    asyncio.create_task(render(lifecycle, 0.05, done))
+    slow = asyncio.create_task(render(lifecycle, 10, done, job))
+    await asyncio.sleep(0)
+    assert lifecycle.in_flight == 2
+
+    await lifecycle.shutdown()
+    assert done == [0.05]
+    assert slow.cancelled()
+    assert lifecycle.in_flight == 0
+    # Недоделанный рендер ждет следующий экземпляр в потоке задач
+    [(_, persisted)] = await queue.read("next", 10)
+    assert persisted == job
+
+
+@pytest.mark.asyncio
+async def test_shutdown_runs_before_storage_is_closed():
+    dp = Dispatcher(storage=MemoryStorage())
+    lifecycle = Lifecycle(drain_timeout=1)
+    lifecycle.install(dp)
+    callbacks = [handler.callback for handler in dp.shutdown.handlers]
+    assert callbacks == [lifecycle.shutdown, dp.fsm.close]
+
+
+@pytest.mark.asyncio
+async def test_render_worker_returns_unfinished_jobs(queue, monkeypatch):
+    async def slow_generate_pdf(data, company_name, owner_id, on_queued):
+        await asyncio.sleep(10)
+        return RenderedPdf("Договор", data=b"%PDF-1.4")
+
+    monkeypatch.setattr(worker, "generate_pdf", slow_generate_pdf)
+    render_worker = RenderWorker(queue, FakeBot(), MemoryStorage(), concurrency=2)
+    await queue.setup()
+    await queue.enqueue(make_job())
+    [(message_id, job)] = await queue.read(render_worker.consumer, 1)
+    render_worker.start(message_id, job)
+    await asyncio.sleep(0)
+
+    render_worker.stop()
+    await render_worker.drain(0.05)
+    # Задача возвращена без траты попытки и сразу доступна другому воркеру
+    [(_, returned)] = await queue.read("next", 10)
+    assert returned.key == job.key and returned.attempt == 1
+    assert await queue.redis.xlen(STREAM) == 1
+
+
+@pytest.mark.asyncio
+async def test_bot_keeps_consuming_saved_renders(queue, monkeypatch):
+    async def fake_generate_pdf(data, company_name, owner_id, on_queued):
+        return RenderedPdf("Договор", data=b"%PDF-1.4")
+
+    async def fake_send_document(bot, chat_id, document):
+        bot.documents.append(document.file_name)
+
+    monkeypatch.setattr(worker, "generate_pdf", fake_generate_pdf)
+    monkeypatch.setattr(worker, "send_document", fake_send_document)
+    bot = FakeBot()
+    lifecycle = Lifecycle(drain_timeout=1)
+    render_worker = RenderWorker(queue, bot, MemoryStorage(), concurrency=2, block=50)
+    consumer = lifecycle.run_worker(render_worker)
+    await asyncio.sleep(0.1)
+
+    # Реплика, остановленная уже после запуска этой, сохраняет свой рендер
+    await queue.enqueue(make_job())
+    for _ in range(50):
+        if bot.documents:
+            break
+        await asyncio.sleep(0.02)
+    assert bot.documents == ["Договор"]
+
+    await lifecycle.shutdown()
+    assert consumer.done() and consumer.exception() is None
@@ -0,0 +1,93 @@
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Message, Update
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from prometheus_client import REGISTRY
+
+from bot.metrics import MetricsMiddleware, metrics
+from bot.models import ContractFormData
+from bot.render import render_pdf
+from tests.conftest import contract_data
+
+
+class MetricsForm(StatesGroup):
+    name = State()
+
+
+class CountingStorage(MemoryStorage):
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    async def get_state(self, key):
+        self.reads += 1
+        return await super().get_state(key)
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_render_pdf_timings():
+    document = render_pdf(ContractFormData(**contract_data), "prostor")
+    assert {"assets", "layer", "drawing", "save"} <= set(document.timings)
+    assert all(seconds >= 0 for seconds in document.timings.values())
+
+
+@pytest.mark.asyncio
+async def test_metrics_middleware():
+    storage = CountingStorage()
+    dp = Dispatcher(storage=storage)
+    dp.message.middleware(MetricsMiddleware())
+
+    @dp.message()
+    async def start_form(message: Message, state: FSMContext):
+        await state.set_state(MetricsForm.name)
+        ContractFormData(**{**contract_data, "quantity": "много"})
+
+    bot = Bot(token="1:test")
+    update = Update.model_validate(
+        {
+            "update_id": 1,
+            "message": {
+                "message_id": 1,
+                "date": 0,
+                "chat": {"id": 1, "type": "private"},
+                "from": {"id": 1, "is_bot": False, "first_name": "Test"},
+                "text": "hello",
+            },
+        }
+    )
+    calls = sample("bot_handler_duration_seconds_count", handler="start_form")
+    errors = sample("bot_validation_errors_total", field="quantity")
+    started = sample("bot_fsm_sessions_started_total", state=MetricsForm.name.state)
+    with pytest.raises(Exception):
+        await dp.feed_update(bot, update)
+
+    assert sample("bot_handler_duration_seconds_count", handler="start_form") == calls + 1
+    assert sample("bot_handler_errors_total", handler="start_form") >= 1
+    assert sample("bot_validation_errors_total", field="quantity") == errors + 1
+    assert (
+        sample("bot_fsm_sessions_started_total", state=MetricsForm.name.state)
+        == started + 1
+    )
+    # Состояние читает только FSMContextMiddleware, метрики его не перечитывают
+    assert storage.reads == 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint():
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    client = TestClient(TestServer(app))
+    await client.start_server()
+    try:
+        response = await client.get("/metrics")
+        assert response.status == 200
+        assert "bot_render_stage_seconds" in await response.text()
+    finally:
+        await client.close()
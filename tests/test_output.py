@@ -0,0 +1,64 @@
+import re
+
+from PIL import Image
+
+from bot.assets import open_image
+from bot.cache import render_key
+from bot.models import ContractFormData
+from bot.render import render_pdf
+from bot.settings import settings
+from bot.static_layer import estimate_saved_bytes, get_static_layer, image_pixels
+from bot.templates import get_template
+from tests.conftest import contract_data
+
+
+def test_open_image_fits_drawn_size(tmp_path):
+    path = tmp_path.joinpath("stamp.png")
+    img = Image.new("RGBA", (100, 50), (10, 20, 30, 255))
+    img.putpixel((0, 0), (0, 0, 0, 255))
+    img.save(path)
+
+    img = open_image(path, size=(20, 80))
+    assert img.size == (20, 50)
+    # Непрозрачный альфа-канал отбрасывается
+    assert img.mode == "RGB"
+    assert open_image(path, transparent_black=True).mode == "RGBA"
+
+
+def test_images_are_downsampled():
+    template = get_template("prostor")
+    # Печать рисуется квадратом 50 мм
+    assert image_pixels(template, 200)["stamp"] == (394, 394)
+
+    layer = get_static_layer("prostor")
+    sizes = image_pixels(template, settings.pdf_image_dpi)
+    for name, reader in layer.assets.items():
+        width, height = reader.getSize()
+        assert width <= sizes[name][0] and height <= sizes[name][1]
+    assert estimate_saved_bytes("prostor") > 0
+
+
+def test_render_pdf_output_is_compact():
+    document = render_pdf(ContractFormData(**contract_data), "prostor")
+    pdf = document.data
+
+    assert document.size == len(pdf)
+    assert b"/ASCII85Decode" not in pdf
+    # Встраиваются только использованные глифы
+    fonts = re.findall(rb"/BaseFont /(\S+)", pdf)
+    assert {b"AAAAAA+FreeSans", b"AAAAAA+FreeSansBold"} <= set(fonts)
+    # Печать, подпись и QES рисуются на обеих страницах, но хранятся один раз
+    assert pdf.count(b"/Subtype /Image") - pdf.count(b"/SMask ") == 3
+
+
+def test_render_pdf_pdfa_profile(monkeypatch):
+    data = ContractFormData(**contract_data)
+    key = render_key(data, "prostor")
+    monkeypatch.setattr(settings, "pdf_profile", "pdfa")
+    assert render_key(data, "prostor") != key
+
+    pdf = render_pdf(data, "prostor").data
+    assert b"/OutputIntents" in pdf
+    assert b"/GTS_PDFA1" in pdf
+    assert b"<pdfaid:part>2</pdfaid:part>" in pdf
+    assert "Счет-договор на поставку товара № 990178".encode() in pdf
@@ -0,0 +1,77 @@
+import re
+import zlib
+
+import pytest
+
+from bot.models import ContractFormData
+from bot.pdfwriter import ESCAPES, UnsupportedText, get_writer
+from bot.render import render_pdf
+from bot.settings import settings
+from tests.conftest import contract_data
+
+items = [
+    {
+        "name": f"Товар {i} с длинным наименованием " * (i % 3 + 1),
+        "quantity": 1,
+        "cost": i,
+    }
+    for i in range(60)
+]
+
+
+def pdf_object(pdf: bytes, number: int) -> bytes:
+    return re.search(rb"(?<!\d)%d 0 obj\s(.*?)endobj" % number, pdf, re.S).group(1)
+
+
+def page_streams(pdf: bytes):
+    trailer = pdf[pdf.rindex(b"trailer") :]
+    root = int(re.search(rb"/Root (\d+) 0 R", trailer).group(1))
+    pages = int(re.search(rb"/Pages (\d+) 0 R", pdf_object(pdf, root)).group(1))
+    kids = re.search(rb"/Kids \[(.*?)\]", pdf_object(pdf, pages)).group(1)
+    streams = []
+    for page in re.findall(rb"(\d+) 0 R", kids):
+        contents = re.search(rb"/Contents (\d+) 0 R", pdf_object(pdf, int(page)))
+        body = pdf_object(pdf, int(contents.group(1)))
+        data = body[body.index(b"stream") + 6 :].lstrip(b"\r\n")
+        streams.append(zlib.decompressobj().decompress(data))
+    return streams
+
+
+def render(data: ContractFormData, fast: bool, monkeypatch) -> bytes:
+    monkeypatch.setattr(settings, "pdf_fast_writer", fast)
+    return render_pdf(data, "prostor").read()
+
+
+def test_escapes_match_reportlab():
+    from reportlab.lib.rl_accel import escapePDF
+
+    assert "".join(ESCAPES) == escapePDF(bytes(range(256)))
+
+
+@pytest.mark.parametrize("extra", [{}, {"items": items}])
+def test_fast_writer_matches_reportlab(extra, monkeypatch):
+    data = ContractFormData(**{**contract_data, **extra})
+    reference = render(data, False, monkeypatch)
+    pdf = render(data, True, monkeypatch)
+
+    assert pdf != reference
+    assert page_streams(pdf) == page_streams(reference)
+    # Все смещения xref указывают на начало своих объектов
+    xref = int(re.search(rb"startxref\s+(\d+)", pdf).group(1))
+    assert pdf[xref:].startswith(b"xref\n")
+    assert pdf.endswith(b"%%EOF\n")
+    entries = re.findall(rb"(\d{10}) 00000 n", pdf[xref:])
+    for number, offset in enumerate(entries, start=1):
+        assert pdf[int(offset) :].startswith(b"%d 0 obj\n" % number)
+    title = "Счет-договор на поставку товара № 990178".encode("utf-16-be")
+    assert b"/Title <FEFF%s>" % title.hex().upper().encode() in pdf
+
+
+def test_fast_writer_falls_back_to_reportlab(monkeypatch):
+    writer = get_writer("prostor")
+    with pytest.raises(UnsupportedText):
+        writer.fonts["FreeSans"].runs("Straße")
+
+    data = ContractFormData(**{**contract_data, "address": "Berlin, Straße 1"})
+    pdf = render(data, True, monkeypatch)
+    assert page_streams(pdf) == page_streams(render(data, False, monkeypatch))
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from bot.models import ContractFormData
+from bot.quick import parse_quick_message, parse_web_app_data, validation_errors
+
+quick_message = """\
+компания: prostor
+Дата: 07.07.2024
+номер договора: 990178
+фамилия: Романова
+имя: Людмила
+отчество: Викторовна
+телефон: +7 (900) 788-90-12
+адрес: г. Москва, ул. Остоженка, д. 90, кв. 78
+товар: Станок Юпитер | 1 | 119990
+товар: Насадка | 2 | 500
+телефон  СБП: +7 (990) 189-90-81
+ФИО СБП: Васильева Ольга Виктровна
+банк СБП: РОСБАНК
+"""
+
+
+def test_parse_quick_message():
+    fields, errors = parse_quick_message(quick_message)
+    assert errors == []
+    assert fields.pop("company_name") == "prostor"
+    data = ContractFormData.model_validate(fields)
+    assert data.contract_number == "990178"
+    assert data.sbp_phone == "+7 (990) 189-90-81"
+    assert [(i.name, i.quantity, i.cost) for i in data.items] == [
+        ("Станок Юпитер", 1, 119990),
+        ("Насадка", 2, 500),
+    ]
+    assert data.total == 120990
+
+
+def test_parse_quick_message_single_item():
+    text = quick_message.replace(
+        "товар: Станок Юпитер | 1 | 119990\nтовар: Насадка | 2 | 500\n",
+        "товар: Станок Юпитер\nколичество: 3\nцена: 10\n",
+    )
+    fields, errors = parse_quick_message(text)
+    assert errors == []
+    assert ContractFormData.model_validate(fields).total == 30
+
+
+def test_quick_errors_are_reported_together():
+    text = quick_message.replace("Насадка | 2 |", "Насадка | 0 |")
+    text = text.replace("телефон: +7 (900) 788-90-12\n", "цвет: синий\n")
+    fields, errors = parse_quick_message(text + "товар: без цены\n")
+    assert errors == ["Строка 7: неизвестное поле «цвет»"]
+
+    with pytest.raises(ValidationError) as e:
+        ContractFormData.model_validate(fields)
+    assert [error.split(":")[0] for error in validation_errors(e.value)] == [
+        "телефон",
+        "товар №2, количество",
+    ]
+
+
+def test_parse_web_app_data():
+    fields, errors = parse_web_app_data(json.dumps({"date": "07.07.2024"}))
+    assert (fields, errors) == ({"date": "07.07.2024"}, [])
+    assert parse_web_app_data("[1]")[1]
+    assert parse_web_app_data("{")[1]
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+from pydantic import ValidationError
+
+from bot.models import ContractFormData
+from bot.render import render_pdf
+from bot.settings import settings
+from bot.static_layer import get_static_layer
+from tests.conftest import contract_data
+
+
+@pytest.mark.parametrize("contract_name", ["prostor", "stroytorgcomplect"])
+def test_render_pdf(contract_name):
+    document = render_pdf(ContractFormData(**contract_data), contract_name)
+    pdf = document.data
+
+    assert document.path is None
+    assert document.file_name.endswith("№ 990178")
+    assert pdf.startswith(b"%PDF")
+    assert pdf.count(b"/Type /Page\n") == 2
+    assert b"/FormXob.static_page1" in pdf
+    assert b"/FormXob.static_page2" in pdf
+    assert get_static_layer(contract_name) is get_static_layer(contract_name)
+
+
+def test_render_pdf_spills_to_disk(monkeypatch):
+    monkeypatch.setattr(settings, "render_spool_size", 0)
+    document = render_pdf(ContractFormData(**contract_data), "prostor")
+    assert document.data is None
+    path = document.path
+    with document:
+        assert document.read().startswith(b"%PDF")
+    assert document.path is None
+    assert not os.path.exists(path)
+
+
+def test_contract_items():
+    data = ContractFormData(**contract_data)
+    assert [(i.name, i.quantity, i.cost) for i in data.items] == [
+        (contract_data["ordered_item"], 1, 119990)
+    ]
+
+    items = [{"name": f"Товар {i}", "quantity": 2, "cost": i} for i in range(1, 4)]
+    data = ContractFormData(**{**contract_data, "items": items})
+    assert data.total == 12
+
+    with pytest.raises(ValidationError):
+        ContractFormData(**{**contract_data, "ordered_item": None})
+
+
+def test_render_pdf_paginates_items():
+    items = [
+        {
+            "name": f"Товар {i} с длинным наименованием " * (i % 3 + 1),
+            "quantity": 1,
+            "cost": i,
+        }
+        for i in range(200)
+    ]
+    data = ContractFormData(**{**contract_data, "items": items})
+    document = render_pdf(data, "prostor")
+    pdf = document.read()
+    assert pdf.count(b"/Type /Page\n") > 4
+    assert b"/FormXob.static_table_header" in pdf
@@ -0,0 +1,107 @@
+import os
+import re
+import subprocess
+import sys
+from typing import Dict
+
+import pytest
+
+# Бюджет на импорт модуля вместе с зависимостями, в секундах. Для бота
+# почти все время уходит на модели aiogram.types, для процессов рендера -
+# на ReportLab и Pillow
+IMPORT_BUDGETS = {
+    "bot.__main__": 5.0,
+    "bot.worker.__main__": 5.0,
+    "bot.render": 1.0,
+}
+
+# Модули, которые не должны загружаться при импорте
+FORBIDDEN = {
+    "bot.__main__": ("reportlab.pdfgen", "reportlab.pdfbase", "PIL", "bot.render"),
+    "bot.worker.__main__": ("bot.handlers", "bot.render"),
+    "bot.render": ("aiogram", "redis", "aiohttp", "prometheus_client"),
+}
+
+
+# Дочерний процесс spawn импортирует главный модуль родителя по его __spec__,
+# если это не __main__ пакета: так запускаются python -m bot и python -m bot.worker
+SPAWN_SCRIPT = """
+import asyncio
+import importlib.util
+import sys
+
+from bot.executor import render_executor
+from tests.test_startup import loaded_modules
+
+sys.modules["__main__"].__spec__ = importlib.util.find_spec(sys.argv[1])
+
+
+async def main():
+    try:
+        return await render_executor.submit(None, loaded_modules)
+    finally:
+        await render_executor.shutdown()
+
+
+print("\\n".join(asyncio.run(main())))
+"""
+
+
+def loaded_modules():
+    return sorted(sys.modules)
+
+
+def import_profile(module: str) -> Dict[str, float]:
+    # Чистый интерпретатор: в процессе pytest все уже импортировано
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env={**os.environ, "BOT_TOKEN": os.environ.get("BOT_TOKEN", "1:a")},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    profile = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)", line)
+        if match is not None:
+            profile[match.group(3)] = int(match.group(1)) / 1_000_000
+    return profile
+
+
+@pytest.mark.parametrize("module", sorted(IMPORT_BUDGETS))
+def test_import_budget(module):
+    profile = import_profile(module)
+
+    loaded = [
+        name
+        for name in profile
+        for prefix in FORBIDDEN[module]
+        if name == prefix or name.startswith(f"{prefix}.")
+    ]
+    assert not loaded, f"{module} imports {', '.join(loaded)}"
+    assert profile[module] < IMPORT_BUDGETS[module], (
+        f"{module} is imported in {profile[module]:.2f}s"
+    )
+
+
+@pytest.mark.parametrize(
+    "main_module", ["bot.__main__", "bot.worker.__main__", "bot.batch.__main__"]
+)
+def test_render_process_imports(main_module):
+    result = subprocess.run(
+        [sys.executable, "-c", SPAWN_SCRIPT, main_module],
+        env={**os.environ, "BOT_TOKEN": os.environ.get("BOT_TOKEN", "1:a")},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = result.stdout.split()
+
+    assert "bot.static_layer" in modules
+    loaded = [
+        name
+        for name in modules
+        for prefix in FORBIDDEN["bot.render"]
+        if name == prefix or name.startswith(f"{prefix}.")
+    ]
+    assert not loaded, f"Render process of {main_module} imports {', '.join(loaded)}"
@@ -0,0 +1,49 @@
+import pytest
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+
+from bot.handlers.handler import Form
+from bot.storage import FormStorage, next_step
+from tests.conftest import LatencyConnection, fake_redis, fill_form, stored_bytes
+
+
+@pytest.mark.asyncio
+async def test_form_storage():
+    storage = FormStorage(fake_redis(), ttl=60)
+    state = FSMContext(storage, StorageKey(bot_id=1, chat_id=2, user_id=2))
+
+    await next_step(state, Form.date, company_name="prostor", items=[])
+    assert await state.get_state() == Form.date.state
+    assert await state.update_data(date="07.07.2024") == {
+        "company_name": "prostor",
+        "items": [],
+        "date": "07.07.2024",
+    }
+    await state.update_data(items=[{"name": "Станок", "quantity": 1, "cost": 10}])
+    assert (await state.get_data())["items"][0]["name"] == "Станок"
+    assert 0 < await storage.redis.ttl("fsm:2:2:form") <= 60
+    assert 0 < await storage.redis.ttl("fsm:2:2:state") <= 60
+
+    await state.clear()
+    assert await state.get_state() is None
+    assert await state.get_data() == {}
+
+
+@pytest.mark.asyncio
+async def test_form_storage_matches_stock_storage():
+    stock = await fill_form(RedisStorage(fake_redis()), 1)
+    assert await fill_form(FormStorage(fake_redis()), 1) == stock
+
+    stock_storage = RedisStorage(fake_redis())
+    LatencyConnection.round_trips = 0
+    await fill_form(stock_storage, 2)
+    stock_round_trips = LatencyConnection.round_trips
+
+    form_storage = FormStorage(fake_redis(), ttl=60)
+    LatencyConnection.round_trips = 0
+    await fill_form(form_storage, 2)
+    assert LatencyConnection.round_trips < stock_round_trips / 2
+    assert await stored_bytes(form_storage.redis) < await stored_bytes(
+        stock_storage.redis
+    )
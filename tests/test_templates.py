@@ -0,0 +1,59 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from bot import templates
+from bot.settings import settings
+from bot.templates import company_names, contracts_path, get_template
+
+
+@pytest.fixture
+def contracts(tmp_path, monkeypatch):
+    shutil.copytree(contracts_path, tmp_path, dirs_exist_ok=True)
+    monkeypatch.setattr(templates, "contracts_path", tmp_path)
+    monkeypatch.setattr(settings, "template_check_interval", 0)
+    monkeypatch.setattr(templates, "_loaded", {})
+    return tmp_path
+
+
+def touch(path):
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+def test_company_templates():
+    assert company_names() == ["prostor", "stroytorgcomplect"]
+    template = get_template("prostor")
+    assert template.contract.company.name == 'ООО "Простор"'
+    assert template.contract.text.startswith("1. Предметом")
+    assert template.layout.body_bottom > 0
+    assert set(template.images) == {"stamp", "qes", "signature"}
+    with pytest.raises(KeyError):
+        get_template("unknown")
+
+
+def test_template_hot_reload(contracts):
+    template = get_template("prostor")
+    assert get_template("prostor") is template
+
+    # Сохранение без изменений не пересобирает шаблон
+    config_path = contracts.joinpath("prostor", "contract.json")
+    touch(config_path)
+    assert get_template("prostor") is template
+
+    config = json.loads(config_path.read_text())
+    config["contract_executor_fio"] = "Иванов Иван Иванович"
+    config["layout"] = {"date": [170, 50]}
+    config_path.write_text(json.dumps(config, ensure_ascii=False))
+    touch(config_path)
+    reloaded = get_template("prostor")
+    assert reloaded.digest != template.digest
+    assert reloaded.contract.contract_executor_fio == "Иванов Иван Иванович"
+    assert reloaded.layout.date != template.layout.date
+
+    # Пока файл сломан, работает последняя загруженная версия
+    config_path.write_text("{")
+    touch(config_path)
+    assert get_template("prostor") is reloaded
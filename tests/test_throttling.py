@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+
+from bot.throttling import MemoryRateLimiter, RedisRateLimiter, ThrottlingMiddleware
+
+
+async def check_bucket(limiter):
+    limits = [await limiter.hit(1) for _ in range(3)]
+    assert [limit.allowed for limit in limits] == [True, True, False]
+    assert limits[2].notify
+    limit = await limiter.hit(1)
+    assert not limit.allowed and not limit.notify
+    assert 0 < limit.retry_after <= 1 / limiter.rate
+    # У других пользователей свои корзины
+    assert (await limiter.hit(2)).allowed
+
+
+@pytest.mark.asyncio
+async def test_memory_rate_limiter():
+    limiter = MemoryRateLimiter(rate=0.01, burst=2)
+    await check_bucket(limiter)
+
+
+@pytest.mark.asyncio
+async def test_redis_rate_limiter():
+    limiter = RedisRateLimiter(fakeredis.FakeAsyncRedis(), rate=0.01, burst=2)
+    await check_bucket(limiter)
+
+
+@pytest.mark.asyncio
+async def test_throttling_middleware():
+    middleware = ThrottlingMiddleware(MemoryRateLimiter(rate=0.01, burst=1))
+    handled = []
+
+    async def handler(event, data):
+        handled.append(event)
+
+    user = SimpleNamespace(id=1)
+    for _ in range(3):
+        await middleware(handler, object(), {"event_from_user": user})
+    await middleware(handler, object(), {})
+    assert len(handled) == 2
@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message
+from aiohttp.test_utils import TestClient, TestServer
+
+from bot.settings import settings
+from bot.webhook import create_app
+
+update = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 1, "type": "private"},
+        "from": {"id": 1, "is_bot": False, "first_name": "Test"},
+        "text": "hello",
+    },
+}
+
+
+@pytest.mark.asyncio
+async def test_webhook(monkeypatch):
+    monkeypatch.setattr(settings, "webhook_secret", "secret")
+    received = []
+    dp = Dispatcher()
+
+    @dp.message()
+    async def echo(message: Message):
+        received.append(message.text)
+
+    client = TestClient(TestServer(create_app(dp, Bot(token="1:test"))))
+    await client.start_server()
+    try:
+        response = await client.post(settings.webhook_path, json=update)
+        assert response.status == 401
+
+        response = await client.post(
+            settings.webhook_path,
+            json=update,
+            headers={"X-Telegram-Bot-Api-Secret-Token": "secret"},
+        )
+        assert response.status == 200
+        await asyncio.sleep(0.1)
+        assert received == ["hello"]
+
+        response = await client.get("/health")
+        assert (await response.json()) == {"status": "ok"}
+    finally:
+        await client.close()